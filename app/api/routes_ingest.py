@@ -1,23 +1,51 @@
+import os
 import uuid
-import json
+import hashlib
 from pathlib import Path
+from typing import BinaryIO
 from fastapi import (
     APIRouter, 
     Depends, 
     UploadFile, 
     File, 
-    Form, 
     HTTPException, 
     status,
     Request
 )
-from app.config import Settings, get_settings
-from app.api.schemas import IngestResponse, IngestType
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from app.config import get_settings
+from app.api.schemas import IngestForm, IngestResponse, IngestType, CACHED_TASK_PREFIX
+from app.store.metadata_store import get_db, create_document, get_document_by_content_hash, get_document_by_source_id, Document
 from app.workers.celery_app import celery_app
 from app.workers.tasks import ingest_video, ingest_audio, ingest_image
 
 router = APIRouter()
 
+# Resolved once at import so uploads don't pay a mkdir/stat per request
+_UPLOAD_DIR = get_settings().UPLOAD_DIR
+_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+# Size of each read/write when copying an upload to disk (8MB)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+def _save_and_hash_upload(source: BinaryIO, destination: Path) -> str:
+    """
+    Copies an upload's spooled temp file to `destination` in fixed-size chunks
+    and returns the SHA-256 of its content.
+    Synchronous: run it in a worker thread so the whole copy costs one
+    thread hop instead of an await per chunk.
+    """
+    hasher = hashlib.sha256()
+    with open(destination, "wb") as buffer:
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            buffer.write(chunk)
+    return hasher.hexdigest()
+
 # --- Helper to select the correct task ---
 
 TASK_MAP = {
@@ -30,67 +58,137 @@ TASK_MAP = {
 @router.post("/ingest", response_model=IngestResponse, status_code=status.HTTP_202_ACCEPTED)
 async def create_ingest_task(
     request: Request,
-    type: IngestType = Form(..., description="The type of media being uploaded"),
     file: UploadFile = File(..., description="The media file to process"),
-    source_id: str = Form(None, description="Optional unique ID for the source (e.g., a meeting ID)"),
-    metadata: str = Form("{}", description="JSON string of arbitrary metadata"),
-    settings: Settings = Depends(get_settings)
+    form: IngestForm = Depends(IngestForm.as_form)
 ):
     """
     Accepts a media file and queues it for asynchronous processing.
+    The form fields (type, source_id, metadata) are validated by IngestForm.
     """
     
     # 1. Generate a unique ID if not provided
-    if not source_id:
-        source_id = str(uuid.uuid4())
-    
-    # 2. Ensure upload directory exists
-    upload_dir = settings.UPLOAD_DIR
-    upload_dir.mkdir(parents=True, exist_ok=True)
+    source_id = form.source_id or str(uuid.uuid4())
     
-    # 3. Create a safe file path
+    # 2. Create a safe file path
+    # (the upload directory is created once at import time)
     # We use the source_id to guarantee a unique, conflict-free name
     file_extension = Path(file.filename).suffix
-    saved_file_path = upload_dir / f"{source_id}{file_extension}"
+    saved_file_path = _UPLOAD_DIR / f"{source_id}{file_extension}"
     
-    # 4. Save the uploaded file
+    # 3. Save the uploaded file
+    # Copy it to disk in chunks on a worker thread so memory stays constant
+    # regardless of upload size and the event loop is never blocked on disk I/O.
+    # The content hash is computed on the same pass for de-duplication.
+    # The copy goes to a unique temp name first: saved_file_path may be the
+    # original of an already ingested (or in-flight) document with this
+    # source_id, which must not be overwritten by a duplicate upload.
+    temp_file_path = _UPLOAD_DIR / f".{uuid.uuid4().hex}{file_extension}.tmp"
     try:
-        with open(saved_file_path, "wb") as buffer:
-            buffer.write(await file.read())
+        content_hash = await run_in_threadpool(_save_and_hash_upload, file.file, temp_file_path)
     except Exception as e:
+        temp_file_path.unlink(missing_ok=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to save uploaded file: {str(e)}"
         )
         
-    # 5. Parse metadata
-    try:
-        metadata_dict = json.loads(metadata)
-    except json.JSONDecodeError:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Metadata must be a valid JSON string."
-        )
+    # 4. Short-circuit if this exact file was already ingested
+    with get_db() as db:
+        existing_doc = get_document_by_content_hash(db, content_hash)
+        existing_source_id = existing_doc.source_id if existing_doc else None
+        # Any other document already owning this source_id (and its file name)
+        source_id_taken = existing_doc is None and get_document_by_source_id(db, source_id) is not None
+    
+    if existing_source_id:
+        temp_file_path.unlink(missing_ok=True)
+        return _cached_ingest_response(request, existing_source_id)
+    
+    # Different content under a source_id that is already used: replacing
+    # its file would swap the media under an in-flight or completed ingest
+    if source_id_taken:
+        temp_file_path.unlink(missing_ok=True)
+        _raise_source_id_conflict(source_id)
 
-    # 6. Select and dispatch the correct Celery task
-    task_function = TASK_MAP.get(type)
+    # 5. Select the correct Celery task
+    task_function = TASK_MAP.get(form.type)
     if not task_function:
+        os.unlink(temp_file_path)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Ingestion type '{type.value}' is not supported."
+            detail=f"Ingestion type '{form.type.value}' is not supported."
         )
+    
+    # 6. Register the document before dispatching, so the unique source_id /
+    # content_hash constraints settle a race between two concurrent uploads
+    # here (the loser gets the same answer as in step 4) instead of failing
+    # inside a worker
+    with get_db() as db:
+        try:
+            doc = create_document(
+                db,
+                source_id=source_id,
+                file_name=saved_file_path.name,
+                doc_type=form.type,
+                storage_path=str(saved_file_path),
+                content_hash=content_hash
+            )
+            document_id = doc.id
+        except IntegrityError:
+            db.rollback()
+            existing_doc = get_document_by_content_hash(db, content_hash)
+            existing_source_id = existing_doc.source_id if existing_doc else None
+            document_id = None
+    
+    if document_id is None:
+        temp_file_path.unlink(missing_ok=True)
+        if existing_source_id:
+            return _cached_ingest_response(request, existing_source_id)
+        _raise_source_id_conflict(source_id)
+    
+    # New content: move it to its final name (atomic on the same filesystem)
+    os.replace(temp_file_path, saved_file_path)
 
-    # Dispatch the task
-    task = task_function.delay(
-        file_path=str(saved_file_path),
-        source_id=source_id,
-        metadata=metadata_dict
-    )
+    # 7. Dispatch the task
+    try:
+        task = task_function.delay(
+            file_path=str(saved_file_path),
+            source_id=source_id,
+            metadata=form.metadata,
+            content_hash=content_hash
+        )
+    except Exception as e:
+        # Nothing will ever process it: release the source_id and hash
+        with get_db() as db:
+            db.query(Document).filter(Document.id == document_id).delete()
+            db.commit()
+        saved_file_path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Failed to queue the ingestion task: {str(e)}"
+        )
 
-    # 7. Return the task ID and a URL to poll for status
+    # 8. Return the task ID and a URL to poll for status
     status_url = request.url_for("get_task_status", task_id=task.id)
     
     return IngestResponse(
         task_id=task.id,
-        status_url=str(status_url)
-    )
\ No newline at end of file
+        status_url=str(status_url),
+        source_id=source_id
+    )
+
+def _cached_ingest_response(request: Request, existing_source_id: str) -> IngestResponse:
+    """Response for an upload identical to an already ingested (or in-flight) file."""
+    task_id = f"{CACHED_TASK_PREFIX}{existing_source_id}"
+    status_url = request.url_for("get_task_status", task_id=task_id)
+    return IngestResponse(
+        task_id=task_id,
+        status_url=str(status_url),
+        source_id=existing_source_id,
+        message="Identical file was already ingested; no new processing was queued."
+    )
+
+def _raise_source_id_conflict(source_id: str):
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Source ID '{source_id}' is already used by a different file."
+    )
@@ -1,7 +1,16 @@
+import logging
+from typing import Any, AsyncIterator, Dict, List
+
+import numpy as np
+import orjson
 from fastapi import APIRouter, Depends
-from app.api.schemas import QueryRequest, QueryResponse
+from fastapi.responses import StreamingResponse
+from app.api.schemas import QueryRequest, QueryResponse, SourceChunk
 from app.retrieval.retriever import get_retriever
 from app.llm.answer_generator import get_answer_generator
+from app.llm.semantic_cache import SemanticCache, get_semantic_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -9,19 +18,111 @@ router = APIRouter()
 async def query_system(
     request: QueryRequest,
     retriever = Depends(get_retriever),
-    answer_generator = Depends(get_answer_generator)
+    answer_generator = Depends(get_answer_generator),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache)
 ):
     """
     Accepts a natural language query and returns a synthesized answer
     based on the ingested multimedia content (RAG).
     """
     
-    print(f"Received query: {request.query}")
+    logger.info("Received query: %s", request.query)
+    
+    # 1. Check the semantic cache for a near-duplicate query
+    query_vector = retriever.embedder.embed_text(request.query)
+    scope_key = SemanticCache.make_scope_key(request, answer_generator.model_name)
+    
+    cached_response = semantic_cache.lookup(query_vector, scope_key)
+    if cached_response is not None:
+        logger.info("Semantic cache hit, skipping retrieval and LLM call.")
+        return cached_response
+    
+    # 2. Retrieve the relevant text chunks
+    relevant_chunks = retriever.retrieve_chunks(request, query_vector=query_vector)
+    
+    # 3. Generate the grounded answer using the LLM
+    response = await answer_generator.generate_answer(request.query, relevant_chunks)
     
-    # 1. Retrieve the relevant text chunks
-    relevant_chunks = retriever.retrieve_chunks(request)
+    # 4. Cache grounded answers only (not fallbacks or API errors)
+    if response.sources:
+        semantic_cache.insert(query_vector, scope_key, response)
     
-    # 2. Generate the grounded answer using the LLM
-    response = answer_generator.generate_answer(request.query, relevant_chunks)
+    return response
+
+@router.post("/query/stream")
+async def query_system_stream(
+    request: QueryRequest,
+    retriever = Depends(get_retriever),
+    answer_generator = Depends(get_answer_generator),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache)
+):
+    """
+    Same as POST /query, but streams the answer as it is generated.
     
-    return response
\ No newline at end of file
+    The response is NDJSON: the first line holds the query_id and sources,
+    each following line an answer delta ({"delta": ...}), and the last
+    line is {"done": true}.
+    """
+    
+    logger.info("Received streaming query: %s", request.query)
+    
+    # 1. Check the semantic cache for a near-duplicate query
+    query_vector = retriever.embedder.embed_text(request.query)
+    scope_key = SemanticCache.make_scope_key(request, answer_generator.model_name)
+    
+    cached_response = semantic_cache.lookup(query_vector, scope_key)
+    if cached_response is not None:
+        logger.info("Semantic cache hit, skipping retrieval and LLM call.")
+        events = _replay_cached_response(cached_response)
+    else:
+        # 2. Retrieve the relevant text chunks, then stream the answer
+        relevant_chunks = retriever.retrieve_chunks(request, query_vector=query_vector)
+        events = _stream_and_cache(
+            answer_generator.stream_answer(request.query, relevant_chunks),
+            relevant_chunks,
+            semantic_cache,
+            query_vector,
+            scope_key
+        )
+    
+    return StreamingResponse(_to_ndjson(events), media_type="application/x-ndjson")
+
+# --- Streaming helpers ---
+
+async def _replay_cached_response(response: QueryResponse) -> AsyncIterator[Dict[str, Any]]:
+    """Emits a cached answer in the same event format as a live stream."""
+    yield {
+        "query_id": response.query_id,
+        "sources": [chunk.model_dump(mode="json") for chunk in response.sources]
+    }
+    yield {"delta": response.answer}
+    yield {"done": True}
+
+async def _stream_and_cache(
+    events: AsyncIterator[Dict[str, Any]],
+    chunks: List[SourceChunk],
+    semantic_cache: SemanticCache,
+    query_vector: np.ndarray,
+    scope_key: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """Passes events through and caches the full answer once it completes without error."""
+    answer_parts = []
+    failed = False
+    async for event in events:
+        if "delta" in event:
+            answer_parts.append(event["delta"])
+        elif "error" in event:
+            failed = True
+        yield event
+    
+    # Cache grounded answers only (not fallbacks or API errors)
+    if chunks and not failed:
+        semantic_cache.insert(
+            query_vector,
+            scope_key,
+            QueryResponse(answer="".join(answer_parts), sources=chunks)
+        )
+
+async def _to_ndjson(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for event in events:
+        yield orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE)
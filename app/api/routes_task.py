@@ -1,44 +1,56 @@
+import threading
+from cachetools import TTLCache, cached
 from fastapi import APIRouter, HTTPException, status
-from celery.result import AsyncResult
 from app.workers.celery_app import celery_app
-from app.api.schemas import TaskStatusResponse, TaskStatus
+from app.api.schemas import TaskStatusResponse, TaskStatus, CACHED_TASK_PREFIX
+from app.store.metadata_store import get_db, get_document_by_source_id
 
 router = APIRouter()
 
+# Clients poll this endpoint about once a second per task. Coalesce bursts
+# of polls for the same task into a single result-backend read.
+TASK_META_CACHE_TTL_SEC = 0.5
+
+@cached(TTLCache(maxsize=4096, ttl=TASK_META_CACHE_TTL_SEC), lock=threading.Lock())
+def _get_task_meta(task_id: str) -> dict:
+    """Fetches state, result and traceback of a task in one backend roundtrip."""
+    return celery_app.backend.get_task_meta(task_id)
+
+# Celery state -> (our TaskStatus, human-readable details)
+_STATE_MAP = {
+    'PENDING': (TaskStatus.PENDING, "Task is waiting in the queue."),
+    'RECEIVED': (TaskStatus.RECEIVED, "Task has been received by a worker."),
+    'STARTED': (TaskStatus.STARTED, "Task has been started by a worker."),
+    'PROCESSING': (TaskStatus.PROCESSING, "Task is currently processing."),
+    'SUCCESS': (TaskStatus.SUCCESS, "Task completed successfully."),
+    'FAILURE': (TaskStatus.FAILURE, "Task failed."),
+}
+
 @router.get("/task/{task_id}", response_model=TaskStatusResponse, name="get_task_status")
 def get_task_status(task_id: str):
     """
     Retrieves the status, progress, and result of an asynchronous task.
     """
-    task_result = AsyncResult(task_id, app=celery_app)
+    # Uploads identical to an already ingested file never reach Celery
+    if task_id.startswith(CACHED_TASK_PREFIX):
+        return _get_cached_ingest_status(task_id)
+
+    meta = _get_task_meta(task_id)
+    state = meta.get('status')
+    # Custom metadata (progress, document_id, errors) or the exception on failure
+    info = meta.get('result')
 
     # --- Map Celery state to our Pydantic TaskStatus enum ---
     
-    if not task_result.state:
+    if not state:
         current_status = TaskStatus.PENDING
         details = "Task not found or state is unknown."
-    elif task_result.state == 'PENDING':
-        current_status = TaskStatus.PENDING
-        details = "Task is waiting in the queue."
-    elif task_result.state == 'RECEIVED':
-        current_status = TaskStatus.RECEIVED
-        details = "Task has been received by a worker."
-    elif task_result.state == 'STARTED':
-        current_status = TaskStatus.STARTED
-        details = "Task has been started by a worker."
-    elif task_result.state == 'PROCESSING':
-        current_status = TaskStatus.PROCESSING
-        details = "Task is currently processing."
-    elif task_result.state == 'SUCCESS':
-        current_status = TaskStatus.SUCCESS
-        details = "Task completed successfully."
-    elif task_result.state == 'FAILURE':
-        current_status = TaskStatus.FAILURE
-        details = "Task failed."
     else:
         # Catch-all for other Celery states (RETRY, REVOKED)
-        current_status = TaskStatus.FAILURE
-        details = f"Task is in an unexpected state: {task_result.state}"
+        current_status, details = _STATE_MAP.get(
+            state,
+            (TaskStatus.FAILURE, f"Task is in an unexpected state: {state}")
+        )
 
     # --- Build the response ---
 
@@ -48,33 +60,54 @@ def get_task_status(task_id: str):
         "details": details,
     }
 
-    if task_result.info and isinstance(task_result.info, dict):
-        # This is where our custom metadata (progress, artifacts, errors) lives
-        response_data.update(task_result.info)
+    if info and isinstance(info, dict):
+        # This is where our custom metadata (progress, document_id, errors) lives
+        response_data.update(info)
         
         # Ensure the status from the task info (which is the source of truth)
         # overrides the mapped Celery state if available.
-        if 'status' in task_result.info:
-             response_data['status'] = task_result.info['status']
+        if 'status' in info:
+             response_data['status'] = info['status']
 
     # If the task failed, 'info' will be the exception.
     if current_status == TaskStatus.FAILURE and not response_data.get('errors'):
-        response_data['errors'] = str(task_result.info)
-        
-    # Handle the case where a task ID doesn't exist at all
-    # (task_result.state will be 'PENDING' but info is None)
-    if task_result.state == 'PENDING' and task_result.info is None:
-        # This could also be a brand new task that hasn't been seen.
-        # But if it stays this way, it might be an unknown task.
-        # For a robust system, you might check task creation time.
-        # For now, this is fine.
-        pass
+        response_data['errors'] = str(info)
 
     # A final check for unknown task IDs
-    if task_result.state == 'PENDING' and not task_result.backend.get(task_result.id):
+    # (the backend reports 'PENDING' with no result for IDs it has never seen)
+    if state == 'PENDING' and info is None:
          raise HTTPException(
              status_code=status.HTTP_404_NOT_FOUND, 
              detail="Task not found."
          )
 
-    return TaskStatusResponse(**response_data)
\ No newline at end of file
+    return TaskStatusResponse(**response_data)
+
+def _get_cached_ingest_status(task_id: str) -> TaskStatusResponse:
+    """Reports the status of the existing document a de-duplicated upload points to."""
+    source_id = task_id[len(CACHED_TASK_PREFIX):]
+    with get_db() as db:
+        doc = get_document_by_source_id(db, source_id)
+        doc_status = doc.status if doc else None
+        document_id = doc.id if doc else None
+
+    if doc_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found."
+        )
+
+    if doc_status == "completed":
+        return TaskStatusResponse(
+            task_id=task_id,
+            status=TaskStatus.SUCCESS,
+            progress_percent=100.0,
+            details=f"File was already ingested as source '{source_id}'.",
+            document_id=document_id
+        )
+
+    return TaskStatusResponse(
+        task_id=task_id,
+        status=TaskStatus.PROCESSING,
+        details=f"An identical file is being ingested as source '{source_id}'."
+    )
@@ -1,6 +1,8 @@
 import uuid
 from enum import Enum  # <--- THIS WAS THE MISSING LINE
-from pydantic import BaseModel, Field
+from fastapi import Form
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, Json, ValidationError
 from typing import Optional, List, Dict, Any, Literal
 
 # --- Enums for controlled vocabularies ---
@@ -23,6 +25,33 @@ class TaskStatus(str, Enum):
 
 # --- Schemas for /ingest ---
 
+# Task IDs with this prefix refer to an already ingested document (identical
+# upload), not a Celery task. The rest of the ID is the document's source_id.
+CACHED_TASK_PREFIX = "cached:"
+
+class IngestForm(BaseModel):
+    """
+    The form fields of an ingestion request, parsed and validated in one pass.
+    `metadata` arrives as a JSON string and is decoded during validation.
+    """
+    type: IngestType = Field(..., description="The type of media being uploaded")
+    source_id: Optional[str] = Field(None, description="Optional unique ID for the source (e.g., a meeting ID)")
+    metadata: Json[Dict[str, Any]] = Field(default_factory=dict, description="JSON string of arbitrary metadata")
+
+    @classmethod
+    def as_form(
+        cls,
+        type: IngestType = Form(..., description="The type of media being uploaded"),
+        source_id: Optional[str] = Form(None, description="Optional unique ID for the source (e.g., a meeting ID)"),
+        metadata: str = Form("{}", description="JSON string of arbitrary metadata")
+    ) -> "IngestForm":
+        """Dependency that builds the model from multipart form fields."""
+        try:
+            return cls(type=type, source_id=source_id, metadata=metadata)
+        except ValidationError as e:
+            # Report bad form data as a 422, like any other request validation error
+            raise RequestValidationError(e.errors())
+
 class IngestResponse(BaseModel):
     """
     Response model after submitting a file for ingestion.
@@ -30,6 +59,7 @@ class IngestResponse(BaseModel):
     """
     task_id: str = Field(..., description="The unique ID for the background ingestion task.")
     status_url: str = Field(..., description="The URL to poll for task status.")
+    source_id: Optional[str] = Field(None, description="The source ID the file is (or was already) ingested under.")
     message: str = "File received and queued for processing."
 
 # --- Schemas for /task/{task_id} ---
@@ -49,6 +79,8 @@ class TaskStatusResponse(BaseModel):
     progress_percent: float = Field(default=0.0, description="Estimated progress (0.0 to 100.0)")
     details: Optional[str] = Field(None, description="Current processing step or error message")
     artifacts: List[ArtifactModel] = Field(default_factory=list, description="List of generated artifacts upon completion")
+    document_id: Optional[int] = Field(None, description="ID of the indexed document in the metadata store, upon completion")
+    chunks_count: Optional[int] = Field(None, description="Number of chunks indexed for the document, upon completion")
     errors: Optional[str] = Field(None, description="Detailed error message if status is 'failure'")
 
 # --- Schemas for /query ---
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, AnyHttpUrl
 from pathlib import Path
@@ -49,15 +50,23 @@ class Settings(BaseSettings):
     # --- Sarvam ---
     SARVAM_API_KEY: str = Field(..., description="API key for Sarvam transcription service")
     SARVAM_API_URL: AnyHttpUrl = "https://api.sarvam.example/v1/transcribe"
+    SARVAM_MAX_CONCURRENCY: int = 8 # Max audio segments transcribed in parallel
 
     # --- Redis / Celery ---
     REDIS_URL: str = "redis://127.0.0.1:6379/0"
     CELERY_BROKER_URL: str = Field(validation_alias="REDIS_URL")
     CELERY_RESULT_BACKEND: str = Field(validation_alias="REDIS_URL")
     CELERY_DEFAULT_QUEUE: str = "cpu_tasks"
+    CELERY_BROKER_POOL_LIMIT: int = 10 # Match the number of threads dispatching/consuming tasks
+    TASK_STATE_MIN_INTERVAL_SEC: float = 1.0 # Min gap between two progress writes to the result backend
+    CELERY_RESULT_EXPIRES_SEC: int = 3600 # How long task results/status stay in the result backend
 
     # --- Database (Metadata Store) ---
     DATABASE_URL: str = "sqlite:///./metadata.db"
+    DB_POOL_SIZE: int = 10 # Persistent connections per process
+    DB_MAX_OVERFLOW: int = 20 # Extra connections allowed under burst
+    DB_POOL_TIMEOUT: int = 5 # Seconds to wait for a free connection before failing
+    SQLITE_BUSY_TIMEOUT_SEC: int = 30 # How long SQLite waits on a locked database
     
     # --- Embeddings / LLM ---
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
@@ -65,11 +74,35 @@ class Settings(BaseSettings):
     
     OPENAI_API_KEY: Optional[str] = Field(None, description="Required if LLM_PROVIDER is 'openai'")
     GOOGLE_API_KEY: Optional[str] = Field(None, description="Required if LLM_PROVIDER is 'gemini'")
+    GEMINI_CONCURRENCY: int = 8 # Max concurrent Gemini Vision requests per video
+    GEMINI_FRAMES_PER_REQUEST: int = 6 # Frames described per Gemini Vision call (1 = one call per frame)
+    LLM_BATCH_MAX_SIZE: int = 8 # Max concurrent queries answered in one Gemini call
+    LLM_BATCH_MAX_WAIT_MS: int = 20 # How long to wait for more queries before dispatching a batch
 
     # --- App Limits (Tuning) ---
     VIDEO_FRAME_INTERVAL_SEC: int = 7
+    VIDEO_FRAME_ENCODE_WORKERS: int = 2 # Threads encoding/writing JPEGs while the next frames are decoded
+    VIDEO_FRAME_MAX_SIDE: int = 768 # Downscale saved frames so their longer side is at most this (0 = native resolution)
+    VIDEO_FRAME_DEDUP_DISTANCE: int = 5 # Skip a frame whose pHash is within this Hamming distance of the last kept frame (0 = keep all)
+    VIDEO_HW_ACCELERATION: bool = True # Ask OpenCV's FFmpeg backend for hardware decoding (NVDEC/VAAPI/...), falls back to CPU
     TRANSCRIPT_CHUNK_SEC: int = 30
-    BATCH_EMBED_SIZE: int = 16
+    FFMPEG_THREADS: int = 2 # Per ffmpeg process; keeps concurrent Celery tasks from oversubscribing cores
+    AUDIO_RESAMPLER: str = "soxr" # ffmpeg aresample engine ("soxr" needs an ffmpeg built with libsoxr; "swr" is always available)
+    BATCH_EMBED_SIZE: int = 64 # Texts per embedding model forward pass
+
+    # --- Vector Index ---
+    FAISS_HNSW_M: int = 32 # Graph neighbours per node
+    FAISS_HNSW_EF_SEARCH: int = 64 # Search breadth (recall vs latency)
+    FAISS_SQ8: bool = False # New indexes store 8-bit scalar-quantized vectors (4x less memory, slight recall loss)
+    FAISS_IVF_NPROBE: int = 16 # Inverted lists probed per query, for IVF indexes (recall vs latency)
+
+    # --- Query Cache ---
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95 # Min cosine similarity to reuse a cached answer
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 256
+    SEMANTIC_CACHE_TTL_SEC: int = 3600
+    RETRIEVAL_REUSE_THRESHOLD: float = 0.9 # Min cosine similarity to rerank a recent query's candidates
+    RETRIEVAL_REUSE_CACHE_SIZE: int = 32
+    RETRIEVAL_CANDIDATE_MULTIPLIER: int = 4 # Candidates kept per query = top_k * this
 
     # --- Derived Paths (Computed properties) ---
     @property
@@ -104,6 +137,7 @@ except Exception as e:
     raise
 
 # --- Helper Function ---
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
     """Dependency for FastAPI to get the settings."""
     return settings
\ No newline at end of file
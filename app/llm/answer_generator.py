@@ -1,12 +1,49 @@
 # app/llm/answer_generator.py (Old Imports)
-from typing import List, Optional, Tuple
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import httpx
 from google import genai
 from google.genai import types
 
 from app.api.schemas import SourceChunk, QueryResponse
 from app.config import get_settings # <--- Need to modify this
 from app.config import get_settings, LLMProvider
-from app.llm.prompt_templates import SYSTEM_INSTRUCTION, RAG_PROMPT_TEMPLATE
+from app.llm.prompt_templates import (
+    SYSTEM_INSTRUCTION,
+    RAG_PROMPT_TEMPLATE,
+    RAG_BATCH_PROMPT_TEMPLATE,
+    RAG_BATCH_ITEM_TEMPLATE,
+    CONTEXT_CHUNK_FORMAT
+)
+from app.llm.batcher import Batcher
+
+logger = logging.getLogger(__name__)
+
+# Connection pool for the Gemini HTTP clients: HTTP/2 multiplexing plus a
+# large keep-alive pool so concurrent queries reuse TLS connections.
+GEMINI_HTTP_LIMITS = httpx.Limits(
+    max_keepalive_connections=50,
+    max_connections=100,
+    keepalive_expiry=60
+)
+GEMINI_HTTP_OPTIONS = types.HttpOptions(
+    client_args={"http2": True, "limits": GEMINI_HTTP_LIMITS},
+    async_client_args={"http2": True, "limits": GEMINI_HTTP_LIMITS}
+)
+
+# Returned when the retriever finds no context for a query
+NO_CONTEXT_ANSWER = "I cannot answer this question because no relevant corporate knowledge was found."
+
+def _api_error_response(e: Exception) -> QueryResponse:
+    """The answer returned for a query whose Gemini call failed."""
+    return QueryResponse(
+        answer=f"The LLM failed to generate a response due to an API error. ({type(e).__name__})",
+        sources=[],
+        query_id="N/A"
+    )
 
 class AnswerGenerator:
     """
@@ -21,23 +58,54 @@ class AnswerGenerator:
         
         # FIX: Compare the settings value with the imported Enum class
         if settings.LLM_PROVIDER != LLMProvider.GEMINI: # <--- CHANGED HERE
-            print(f"FATAL: AnswerGenerator configured for Gemini, but LLM_PROVIDER is {settings.LLM_PROVIDER}")
+            logger.critical("AnswerGenerator configured for Gemini, but LLM_PROVIDER is %s", settings.LLM_PROVIDER)
             raise ValueError("LLM Provider Mismatch")
         
         # ... rest of the code is unchanged ...
             
         # Initialize the Gemini Client
         self.client = genai.Client(
-            api_key=settings.GOOGLE_API_KEY
+            api_key=settings.GOOGLE_API_KEY,
+            http_options=GEMINI_HTTP_OPTIONS
         )
         # Use a model appropriate for grounded QA
         self.model_name = "gemini-2.5-flash" 
         
-        print(f"[LLM] Gemini client initialized with model {self.model_name}.")
+        # Concurrent queries arriving within a short window share one Gemini call
+        self._batcher = Batcher(
+            self._answer_batch,
+            max_batch=settings.LLM_BATCH_MAX_SIZE,
+            max_wait_ms=settings.LLM_BATCH_MAX_WAIT_MS
+        )
+        
+        logger.info("Gemini client initialized with model %s.", self.model_name)
+
+    def _build_config(self, max_output_tokens: int, response_mime_type: Optional[str] = None) -> types.GenerateContentConfig:
+        """Builds the generation config (system instruction + sampling settings)."""
+        return types.GenerateContentConfig(
+            system_instruction=SYSTEM_INSTRUCTION,
+            temperature=0.2, # Lower temperature for factual RAG
+            max_output_tokens=max_output_tokens,
+            response_mime_type=response_mime_type
+        )
 
-    def generate_answer(self, query: str, chunks: List[SourceChunk]) -> QueryResponse:
+    @staticmethod
+    def _format_context(chunks: List[SourceChunk]) -> str:
+        """Formats the chunks into a single context string for the prompt."""
+        # Pre-sized list + one bound %-format per chunk, joined once
+        context_list = [None] * len(chunks)
+        format_chunk = CONTEXT_CHUNK_FORMAT.__mod__
+        for i, chunk in enumerate(chunks):
+            # Each chunk is prefixed with its source info
+            context_list[i] = format_chunk((i + 1, chunk.source_file, chunk.start_time or 0.0, chunk.chunk_text))
+            
+        return "\n\n".join(context_list)
+
+    async def generate_answer(self, query: str, chunks: List[SourceChunk]) -> QueryResponse:
         """
         Generates an answer grounded in the provided context chunks.
+        
+        Concurrent calls are transparently batched into a single Gemini request.
         """
         
         if not self.client:
@@ -45,37 +113,88 @@ class AnswerGenerator:
         if not chunks:
             # Fallback when retriever finds nothing
             return QueryResponse(
-                answer="I cannot answer this question because no relevant corporate knowledge was found.",
+                answer=NO_CONTEXT_ANSWER,
                 sources=[],
                 query_id="N/A"
             )
         
+        return await self._batcher.submit((query, chunks))
+
+    async def _answer_batch(self, items: List[Tuple[str, List[SourceChunk]]]) -> List[QueryResponse]:
+        """
+        Batch handler: answers all queued (query, chunks) pairs with one Gemini call.
+        Falls back to one call per query for a single item or an unparsable batch reply.
+        """
+        if len(items) == 1:
+            return [await self._answer_single(*items[0])]
+        
+        logger.info("Sending a batch of %d queries to Gemini...", len(items))
+        
+        questions = "".join(
+            RAG_BATCH_ITEM_TEMPLATE.format(
+                index=i + 1,
+                context=self._format_context(chunks),
+                query=query
+            )
+            for i, (query, chunks) in enumerate(items)
+        )
+        final_prompt = RAG_BATCH_PROMPT_TEMPLATE.format(count=len(items), questions=questions)
+        config = self._build_config(
+            max_output_tokens=min(2048 * len(items), 8192),
+            response_mime_type="application/json"
+        )
+        
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=self.model_name,
+                contents=final_prompt,
+                config=config
+            )
+        except Exception as e:
+            # API errors (429/quota included) are not retried per query:
+            # that would multiply the request rate by the batch size
+            logger.error("Error calling Gemini API for a batch of %d queries: %s", len(items), e)
+            return [_api_error_response(e) for _ in items]
+        
+        try:
+            answers = json.loads(response.text)
+            if not isinstance(answers, list) or len(answers) != len(items):
+                raise ValueError(f"Expected a JSON array of {len(items)} answers")
+        except (ValueError, TypeError) as e: # (json.JSONDecodeError is a ValueError)
+            logger.warning("Unparsable batch reply (%s), answering queries individually...", e)
+            return list(await asyncio.gather(
+                *(self._answer_single(query, chunks) for query, chunks in items)
+            ))
+        
+        return [
+            QueryResponse(answer=str(answer), sources=chunks)
+            for answer, (_, chunks) in zip(answers, items)
+        ]
+
+    def _prepare_request(self, query: str, chunks: List[SourceChunk]) -> Tuple[str, types.GenerateContentConfig]:
+        """Builds the prompt and generation config for a single query."""
+        
         # 1. Format the context for the prompt
-        context_list = []
-        for i, chunk in enumerate(chunks):
-            # Format each chunk to include source info
-            source_info = f"[Source {i+1}, File: {chunk.source_file}, Time: {chunk.start_time:.1f}s]"
-            context_list.append(f"{source_info}\n{chunk.chunk_text}")
-            
-        context_string = "\n\n".join(context_list)
+        context_string = self._format_context(chunks)
         
-        # 2. Assemble the final prompt
+        # 2. Assemble the final prompt and config
+        config = self._build_config(max_output_tokens=2048)
         final_prompt = RAG_PROMPT_TEMPLATE.format(
             context=context_string,
             query=query
         )
+        return final_prompt, config
+
+    async def _answer_single(self, query: str, chunks: List[SourceChunk]) -> QueryResponse:
+        """Answers one query with its own Gemini call."""
         
-        print(f"[LLM] Sending query and {len(chunks)} chunks to Gemini...")
+        logger.info("Sending query and %d chunks to Gemini...", len(chunks))
         
         try:
-            # 3. Call the Gemini API
-            config = types.GenerateContentConfig(
-                system_instruction=SYSTEM_INSTRUCTION,
-                temperature=0.2, # Lower temperature for factual RAG
-                max_output_tokens=2048
-            )
+            final_prompt, config = self._prepare_request(query, chunks)
             
-            response = self.client.models.generate_content(
+            # 3. Call the Gemini API
+            response = await self.client.aio.models.generate_content(
                 model=self.model_name,
                 contents=final_prompt,
                 config=config
@@ -89,12 +208,51 @@ class AnswerGenerator:
             )
 
         except Exception as e:
-            print(f"Error calling Gemini API: {e}")
-            return QueryResponse(
-                answer=f"The LLM failed to generate a response due to an API error. ({type(e).__name__})",
-                sources=[],
-                query_id="N/A"
+            logger.error("Error calling Gemini API: %s", e)
+            return _api_error_response(e)
+
+    async def stream_answer(self, query: str, chunks: List[SourceChunk]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams an answer grounded in the provided context chunks.
+        
+        Yields, in order:
+            {"query_id": ..., "sources": [...]} - before generation starts
+            {"delta": "..."}                    - one per generated text piece
+            {"error": "..."}                    - only if the Gemini call fails
+            {"done": True}                      - always last
+        """
+        if not self.client:
+            raise Exception("Gemini client failed to initialize. Check GOOGLE_API_KEY.")
+        
+        yield {
+            "query_id": str(uuid.uuid4()),
+            "sources": [chunk.model_dump(mode="json") for chunk in chunks]
+        }
+        
+        if not chunks:
+            # Fallback when retriever finds nothing
+            yield {"delta": NO_CONTEXT_ANSWER}
+            yield {"done": True}
+            return
+        
+        logger.info("Streaming answer for query with %d chunks from Gemini...", len(chunks))
+        
+        try:
+            final_prompt, config = self._prepare_request(query, chunks)
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.model_name,
+                contents=final_prompt,
+                config=config
             )
+            async for response_chunk in stream:
+                if response_chunk.text:
+                    yield {"delta": response_chunk.text}
+        
+        except Exception as e:
+            logger.error("Error streaming from Gemini API: %s", e)
+            yield {"error": f"The LLM failed to generate a response due to an API error. ({type(e).__name__})"}
+        
+        yield {"done": True}
 
 # --- Singleton setup for Dependency Injection ---
 
@@ -11,6 +11,10 @@ RULES:
 5. List the sources (file name and timestamp) used to generate your answer.
 """
 
+# How each retrieved chunk is presented inside the CONTEXT block
+# (%-style: source number, file name, start time in seconds, chunk text)
+CONTEXT_CHUNK_FORMAT = "[Source %d, File: %s, Time: %.1fs]\n%s"
+
 # The main template structure for RAG
 RAG_PROMPT_TEMPLATE = """
 CONTEXT:
@@ -21,4 +25,25 @@ CONTEXT:
 USER QUESTION: "{query}"
 
 Based ONLY on the CONTEXT provided above, generate a final, definitive answer that adheres to your rules.
-"""
\ No newline at end of file
+"""
+
+# --- Batched variant ---
+# Used when several concurrent queries are answered with a single Gemini call.
+RAG_BATCH_PROMPT_TEMPLATE = """
+Answer the following {count} questions independently. Each question comes with its own CONTEXT.
+Use ONLY the CONTEXT belonging to a question to answer it, following your rules.
+
+{questions}
+
+Output a JSON array of exactly {count} strings, where the i-th string is the answer to QUESTION i.
+"""
+
+RAG_BATCH_ITEM_TEMPLATE = """
+QUESTION {index}:
+CONTEXT:
+---
+{context}
+---
+
+USER QUESTION: "{query}"
+"""
@@ -0,0 +1,135 @@
+import json
+import time
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import faiss
+import numpy as np
+
+from app.api.schemas import QueryRequest, QueryResponse
+from app.config import get_settings
+from app.services.embedder import get_embedding_service
+
+
+class SemanticCache:
+    """
+    An in-process cache of previously generated answers, keyed by the
+    embedding of the query that produced them.
+
+    A new query whose (normalized) embedding has a cosine similarity of at
+    least `threshold` with a cached query - and shares the same scope
+    (filters, top_k, model) - is answered straight from the cache, skipping
+    both retrieval and the LLM call.
+
+    Entries expire after `ttl_seconds` and the least recently used entry
+    is evicted once `max_entries` is reached.
+    """
+
+    def __init__(self, embedding_dim: int, threshold: float = 0.95,
+                 max_entries: int = 256, ttl_seconds: float = 3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        # Inner Product on normalized vectors == cosine similarity.
+        # IDMap2 lets us remove individual entries on eviction.
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedding_dim))
+
+        # entry_id -> (scope_key, response, created_at), oldest/least recently used first
+        self._entries: "OrderedDict[int, tuple[str, QueryResponse, float]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_scope_key(request: QueryRequest, model_name: str) -> str:
+        """
+        Builds a stable string for everything besides the query text that
+        influences the answer. Only answers with the same scope are reused.
+        """
+        filters = request.filters.model_dump(mode="json") if request.filters else None
+        return json.dumps(
+            {"filters": filters, "top_k": request.top_k, "model": model_name},
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+
+    def lookup(self, query_vector: np.ndarray, scope_key: str) -> Optional[QueryResponse]:
+        """Returns a cached response for a near-duplicate query, or None on a miss."""
+        with self._lock:
+            self._evict_expired()
+            if self._index.ntotal == 0:
+                return None
+
+            # A handful of neighbours is enough to skip entries from another scope
+            k = min(self._index.ntotal, 8)
+            scores, ids = self._index.search(self._as_matrix(query_vector), k)
+
+            # Results are sorted by similarity, so stop at the first one below threshold
+            for score, entry_id in zip(scores[0].tolist(), ids[0].tolist()):
+                if entry_id == -1 or score < self.threshold:
+                    break
+                entry = self._entries.get(entry_id)
+                if entry is None or entry[0] != scope_key:
+                    continue
+
+                self._entries.move_to_end(entry_id)
+                # Every interaction still gets its own query_id
+                return entry[1].model_copy(update={"query_id": str(uuid.uuid4())})
+
+            return None
+
+    def insert(self, query_vector: np.ndarray, scope_key: str, response: QueryResponse):
+        """Caches a response for the given query embedding and scope."""
+        with self._lock:
+            self._evict_expired()
+            while len(self._entries) >= self.max_entries:
+                oldest_id, _ = self._entries.popitem(last=False)
+                self._remove_ids([oldest_id])
+
+            entry_id = self._next_id
+            self._next_id += 1
+
+            self._index.add_with_ids(
+                self._as_matrix(query_vector),
+                np.array([entry_id], dtype=np.int64)
+            )
+            self._entries[entry_id] = (scope_key, response, time.monotonic())
+
+    def _evict_expired(self):
+        """Drops every entry older than the TTL. Caller must hold the lock."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [entry_id for entry_id, (_, _, created_at) in self._entries.items()
+                   if created_at < cutoff]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        self._remove_ids(expired)
+
+    def _remove_ids(self, entry_ids):
+        if entry_ids:
+            self._index.remove_ids(np.array(entry_ids, dtype=np.int64))
+
+    @staticmethod
+    def _as_matrix(query_vector: np.ndarray) -> np.ndarray:
+        # FAISS expects a 2D float32 array of shape (1, dim)
+        return np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+
+# --- Singleton setup for Dependency Injection ---
+
+_semantic_cache: Optional[SemanticCache] = None
+
+def get_semantic_cache() -> SemanticCache:
+    """
+    Dependency injector for the singleton SemanticCache.
+    """
+    global _semantic_cache
+    if _semantic_cache is None:
+        settings = get_settings()
+        _semantic_cache = SemanticCache(
+            embedding_dim=get_embedding_service().embedding_dim,
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SEC
+        )
+    return _semantic_cache
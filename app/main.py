@@ -1,25 +1,64 @@
+import logging
+import queue
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import FastAPI, Depends, Request
+from fastapi.responses import ORJSONResponse
 from app.config import Settings, get_settings
 from app.api import routes_ingest, routes_task, routes_query
 from app.store.metadata_store import create_db_and_tables  # <-- 1. ADD THIS IMPORT
+from app.retrieval.retriever import get_retriever
+from app.llm.answer_generator import get_answer_generator
+from app.llm.semantic_cache import get_semantic_cache
+
+# --- Logging ---
+def configure_logging(settings: Settings) -> QueueListener:
+    """
+    Routes all application log records through a queue so request handlers
+    only enqueue them; the actual stream I/O happens on a background thread.
+    Records below LOG_LEVEL are dropped before any message formatting.
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    )
+    
+    root_logger = logging.getLogger()
+    root_logger.setLevel(settings.LOG_LEVEL.value)
+    root_logger.handlers = [QueueHandler(log_queue)]
+    
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+# --- Application Lifespan (Startup / Shutdown) ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs when the application starts.
+    Creates all necessary database tables and pre-warms the query services
+    (embedding model, FAISS index, Gemini client) so the first /query
+    doesn't pay the model-load cost.
+    """
+    log_listener = configure_logging(get_settings())
+    create_db_and_tables()
+    get_retriever()
+    get_answer_generator()
+    get_semantic_cache()
+    yield
+    log_listener.stop()
 
 # Create the FastAPI app instance
 app = FastAPI(
     title="Multimodal RAG Ingestion & Query Engine",
     description="API for ingesting video, audio, and images for RAG.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    # orjson's C serializer is much faster than stdlib json for large responses
+    default_response_class=ORJSONResponse
 )
 
-# --- Create Database Tables on Startup ---
-@app.on_event("startup")
-def on_startup():
-    """
-    Event handler that runs when the application starts.
-    This creates all necessary database tables.
-    """
-    create_db_and_tables()
-# --- 2. ADD THIS ENTIRE BLOCK ---
-
 
 # --- Include API Routers ---
 # These imports bring in the endpoints you defined in other files.
@@ -41,11 +80,12 @@ app.include_router(
 
 # --- Root Endpoint / Health Check ---
 @app.get("/", tags=["Health Check"])
-async def read_root(settings: Settings = Depends(get_settings)):
+async def read_root():
     """
     Root endpoint for health check.
     Returns the application name and current settings (excluding secrets).
     """
+    settings = get_settings()
     return {
         "app_name": "Multimodal RAG Engine",
         "log_level": settings.LOG_LEVEL,
@@ -1,10 +1,14 @@
+import collections
+import logging
 from typing import List,Optional
 import numpy as np
 from app.api.schemas import QueryRequest, SourceChunk
+from app.config import get_settings
 from app.services.embedder import get_embedding_service
 from app.store.vector_store import get_vector_store
 from app.store.metadata_store import get_db, get_chunks_by_vector_ids, TextChunk
 
+logger = logging.getLogger(__name__)
 
 class Retriever:
     """
@@ -12,59 +16,80 @@ class Retriever:
     the most relevant text chunks (context) from the vector store.
     """
     def __init__(self):
+        settings = get_settings()
         self.embedder = get_embedding_service()
-        self.vector_store = get_vector_store()
+        # The API only searches: load the index memory-mapped and read-only
+        self.vector_store = get_vector_store(read_only=True)
+        
+        # Locality-based reuse: recent queries and their (larger) candidate sets.
+        # Each entry is (query_vector, candidate_vectors, candidate_chunks, k_searched).
+        self.reuse_threshold = settings.RETRIEVAL_REUSE_THRESHOLD
+        self.candidate_multiplier = settings.RETRIEVAL_CANDIDATE_MULTIPLIER
+        self._recent = collections.deque(maxlen=settings.RETRIEVAL_REUSE_CACHE_SIZE)
     
-    def retrieve_chunks(self, request: QueryRequest) -> List[SourceChunk]:
+    def retrieve_chunks(self, request: QueryRequest, query_vector: Optional[np.ndarray] = None) -> List[SourceChunk]:
         """
         Processes the query, searches the vector index, and returns 
         the enriched source chunks.
+        
+        If the caller already embedded the query, pass it as `query_vector`
+        to avoid embedding it twice.
         """
-        print(f"[Retriever] Received query: '{request.query}'")
+        logger.info("Received query: '%s'", request.query)
         
         # 1. Embed the user query
-        print(f"[Retriever] Embedding query...")
-        query_vector = self.embedder.embed_text(request.query)
+        if query_vector is None:
+            logger.debug("Embedding query...")
+            query_vector = self.embedder.embed_text(request.query)
+        
+        # 2. Try to answer from a recent, semantically adjacent query
+        reused_chunks = self._rerank_recent(query_vector, request.top_k)
+        if reused_chunks is not None:
+            logger.info("Reused candidates of a nearby query (%d chunks).", len(reused_chunks))
+            return reused_chunks
         
-        # 2. Search the FAISS index
+        # 3. Search the FAISS index
+        # We fetch more candidates than requested so nearby future queries
+        # can be answered by reranking them locally.
         # This returns the scores (distances) and the internal FAISS IDs
-        print(f"[Retriever] Searching FAISS for top_k={request.top_k}...")
-        distances, vector_ids = self.vector_store.search(query_vector, request.top_k)
+        candidate_k = request.top_k * self.candidate_multiplier
+        logger.debug("Searching FAISS for top_k=%d (%d candidates)...", request.top_k, candidate_k)
+        distances, vector_ids = self.vector_store.search(query_vector, candidate_k)
         
-        # Filter out invalid IDs (e.g., -1 if index is not full)
-        valid_vector_ids = [int(vid) for vid in vector_ids if vid != -1]
+        # Filter out invalid IDs (e.g., -1 if index is not full).
+        # Scores are inner products of normalized vectors (cosine, higher = better)
+        # and FAISS already returns them sorted descending, so the masked
+        # arrays keep that order and no re-sorting is needed later.
+        mask = vector_ids != -1
+        valid_ids = vector_ids[mask].tolist()
+        valid_scores = distances[mask].tolist()
         
-        if not valid_vector_ids:
-            print("[Retriever] No relevant vectors found.")
+        if not valid_ids:
+            logger.info("No relevant vectors found.")
             return []
             
-        # 3. Retrieve metadata (text content) from the SQL DB
-        print(f"[Retriever] Retrieving metadata for {len(valid_vector_ids)} vectors...")
-        
-        # FAISS results (distances and IDs) often need to be sorted before use, 
-        # but the search result is already distance-sorted. We need to 
-        # match the retrieved chunks back to their distance scores.
-        
-        # Create a mapping of FAISS ID -> distance score for easy lookup
-        score_map = {int(vector_ids[i]): float(distances[i]) 
-                     for i in range(len(vector_ids)) if vector_ids[i] != -1}
-        
-        # Retrieve the chunks from the database
+        # 4. Retrieve metadata (text content) from the SQL DB
+        logger.debug("Retrieving metadata for %d vectors...", len(valid_ids))
         with get_db() as db:
-            metadata_chunks: List[TextChunk] = get_chunks_by_vector_ids(db, valid_vector_ids)
+            metadata_chunks: List[TextChunk] = get_chunks_by_vector_ids(db, valid_ids)
         
-        # 4. Assemble the final SourceChunk list for the LLM
+        # 5. Assemble the final SourceChunk list for the LLM, in FAISS order
+        # (Note: Filter logic is simplified here; fully integrating it 
+        # requires modifying the SQL query in metadata_store.py)
+        # The chunks come back in the same order as the IDs (minus any
+        # without a DB row), so we walk both lists together.
+        # The data comes from our own DB, so skip Pydantic re-validation.
         source_chunks: List[SourceChunk] = []
-        for chunk in metadata_chunks:
-            # Check if the chunk belongs to a document matching the filters
-            # (Note: Filter logic is simplified here; fully integrating it 
-            # requires modifying the SQL query in metadata_store.py)
-            
-            # For now, just map the retrieved chunk data to the schema
-            score = score_map.get(chunk.vector_id, 0.0)
+        chunk_iter = iter(metadata_chunks)
+        chunk = next(chunk_iter, None)
+        for vector_id, score in zip(valid_ids, valid_scores):
+            if chunk is None:
+                break
+            if chunk.vector_id != vector_id:
+                continue
             
             source_chunks.append(
-                SourceChunk(
+                SourceChunk.model_construct(
                     source_file=chunk.document.source_file_name,
                     chunk_text=chunk.text_content,
                     start_time=chunk.start_time,
@@ -73,13 +98,54 @@ class Retriever:
                     metadata={"document_id": chunk.document_id, "vector_id": chunk.vector_id}
                 )
             )
-            
-        # Ensure the final list is sorted by score (distance) descending
-        source_chunks.sort(key=lambda x: x.score, reverse=True)
+            chunk = next(chunk_iter, None)
+        
+        self._remember(query_vector, source_chunks, candidate_k)
         
-        print(f"[Retriever] Retrieved {len(source_chunks)} relevant chunks.")
+        source_chunks = source_chunks[:request.top_k]
+        logger.info("Retrieved %d relevant chunks.", len(source_chunks))
         return source_chunks
 
+    def _rerank_recent(self, query_vector: np.ndarray, top_k: int) -> Optional[List[SourceChunk]]:
+        """
+        If a recent query is within the reuse threshold of this one, rerank its
+        cached candidates against the new query vector (no FAISS or SQL call).
+        Returns None when no recent query is close enough.
+        """
+        if not self._recent:
+            return None
+        
+        recent = list(self._recent)
+        recent_matrix = np.stack([entry[0] for entry in recent])
+        similarities = recent_matrix @ query_vector
+        best = int(np.argmax(similarities))
+        
+        _, candidate_vectors, candidate_chunks, k_searched = recent[best]
+        if similarities[best] < self.reuse_threshold or k_searched < top_k:
+            return None
+        
+        # Embeddings are normalized, so the dot product is the cosine score
+        scores = candidate_vectors @ query_vector
+        order = np.argsort(-scores)[:top_k]
+        return [
+            candidate_chunks[i].model_copy(update={"score": float(scores[i])})
+            for i in order.tolist()
+        ]
+
+    def _remember(self, query_vector: np.ndarray, source_chunks: List[SourceChunk], k_searched: int):
+        """Stores a query's full candidate set for later locality-based reuse."""
+        if not source_chunks:
+            return
+        try:
+            candidate_vectors = self.vector_store.get_vectors(
+                [chunk.metadata["vector_id"] for chunk in source_chunks]
+            )
+        except RuntimeError as e:
+            # Some index types cannot reconstruct stored vectors
+            logger.warning("Skipping locality cache: %s", e)
+            return
+        self._recent.append((query_vector, candidate_vectors, source_chunks, k_searched))
+
 # --- Singleton setup for Dependency Injection ---
 
 _retriever: Optional[Retriever] = None
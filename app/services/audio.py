@@ -3,73 +3,136 @@ import os
 from pathlib import Path
 from typing import List
 from app.config import Settings, get_settings
-import ffmpeg # <--- ADD THIS LINE HERE
 # --- Constants ---
 # Most ASR (Automatic Speech Recognition) models, including Sarvam's,
 # are trained on 16kHz, single-channel (mono) audio.
 REQUIRED_SAMPLE_RATE = 16000
 REQUIRED_AUDIO_CHANNELS = 1
-OUTPUT_FORMAT = "mp3" # Using mp3 for good compression
+# 16-bit PCM WAV: Sarvam accepts it directly, and it costs almost no CPU to
+# write compared with an MP3 (LAME) encode. A 29s mono 16kHz segment is ~0.9MB.
+OUTPUT_FORMAT = "wav"
+OUTPUT_CODEC = "pcm_s16le"
 
 class AudioProcessingError(Exception):
     """Custom exception for audio processing failures."""
     pass
 
-def prepare_audio_for_transcription(
-    input_path: Path, 
+def _is_segment_ready_audio(input_path: Path) -> bool:
+    """
+    Checks whether the first audio stream of `input_path` already has the
+    segment format (16-bit PCM, 16kHz, mono), so it can be split by stream-copy.
+    Any probe failure is treated as "no" (we just re-encode).
+    """
+    try:
+        probe = ffmpeg.probe(str(input_path), select_streams='a:0')
+    except ffmpeg.Error:
+        return False
+    
+    streams = probe.get('streams') or []
+    if not streams:
+        return False
+    
+    audio_stream = streams[0]
+    return (
+        audio_stream.get('codec_name') == OUTPUT_CODEC
+        and int(audio_stream.get('sample_rate', 0)) == REQUIRED_SAMPLE_RATE
+        and int(audio_stream.get('channels', 0)) == REQUIRED_AUDIO_CHANNELS
+    )
+
+def prepare_and_split_audio(
+    input_path: Path,
     output_dir: Path,
-    source_id: str
-) -> Path:
+    source_id: str,
+    segment_duration_sec: int = 29
+) -> List[Path]:
     """
-    Extracts audio from any media file, converts it to mono,
-    resamples it to 16kHz, and saves it as an MP3.
+    Extracts audio from any media file, converts it to mono, resamples it
+    to 16kHz and splits it into PCM WAV segments of at most `segment_duration_sec`
+    seconds (29s to strictly conform to the 30-second API limit).
+    
+    This is done in a single ffmpeg pass directly on the original input, so
+    the audio is decoded and encoded only once (no intermediate prepared file).
     
     This function is synchronous and should be run inside a Celery task.
     
     Args:
         input_path: Path to the original media file (e.g., .mp4, .wav).
-        output_dir: The directory to save the processed audio (e.g., data/transcripts).
+        output_dir: The directory to save the segments under (e.g., data/transcripts);
+                    they are written to `output_dir/segments/<source_id>/`.
         source_id: The unique ID for this file.
+        segment_duration_sec: Maximum length of each segment.
         
     Returns:
-        The Path to the newly created audio file.
+        The sorted list of segment Paths.
         
     Raises:
         AudioProcessingError: If ffmpeg fails.
     """
-    output_filename = f"{source_id}_prepared.{OUTPUT_FORMAT}"
-    output_path = output_dir / output_filename
+    settings = get_settings()
+    # One directory per source: another source whose ID merely starts with
+    # this one (e.g. "meeting1" vs "meeting1_part2") never shares its listing
+    segment_output_dir = output_dir / "segments" / source_id
+    output_pattern = str(segment_output_dir / f"{source_id}_%03d.{OUTPUT_FORMAT}")
     
-    print(f"[AudioService] Preparing audio for {source_id}...")
+    print(f"[AudioService] Preparing and splitting audio for {source_id} into {segment_duration_sec}s segments...")
     print(f"[AudioService]   Input: {input_path}")
-    print(f"[AudioService]   Output: {output_path}")
+    print(f"[AudioService]   Output: {output_pattern}")
 
     try:
         # Ensure the output directory exists
-        output_dir.mkdir(parents=True, exist_ok=True)
+        segment_output_dir.mkdir(parents=True, exist_ok=True)
 
         # Build the ffmpeg command using ffmpeg-python
-        stream = ffmpeg.input(str(input_path))
+        # -threads (input and output) caps decoder/encoder threads so parallel
+        # ingestion tasks don't each spawn one thread per core
+        stream = ffmpeg.input(str(input_path), threads=settings.FFMPEG_THREADS)
+        
+        # -map 0:a: Ensure we ONLY process the audio stream
+        # -f segment: Write consecutive segments of segment_time seconds
+        if _is_segment_ready_audio(input_path):
+            # Already mono 16kHz PCM: -c copy splits the existing samples
+            # without decoding or re-encoding them
+            print(f"[AudioService]   Input is already mono {REQUIRED_SAMPLE_RATE}Hz {OUTPUT_CODEC}; splitting by stream-copy.")
+            codec_args = {'c': 'copy'}
+        else:
+            # -c:a pcm_s16le: Raw 16-bit PCM (no lossy, CPU-heavy encode)
+            # -ac: Set audio channels to 1 (mono)
+            # -ar: Set audio rate (sample rate) to 16kHz
+            # -af aresample: Resample with the configured engine (soxr by default)
+            codec_args = {
+                'c': OUTPUT_CODEC,
+                'ac': REQUIRED_AUDIO_CHANNELS,
+                'ar': REQUIRED_SAMPLE_RATE,
+                'af': f'aresample=resampler={settings.AUDIO_RESAMPLER}'
+            }
         
-        # Select only the audio stream ('a')
-        # -ac: Set audio channels to 1 (mono)
-        # -ar: Set audio rate (sample rate) to 16kHz
-        # -f: Set output format to mp3
         stream = ffmpeg.output(
-            stream.audio, 
-            str(output_path), 
-            ac=REQUIRED_AUDIO_CHANNELS,
-            ar=REQUIRED_SAMPLE_RATE,
-            f=OUTPUT_FORMAT
+            stream,
+            output_pattern,
+            map='0:a',
+            f='segment',
+            segment_time=segment_duration_sec,
+            threads=settings.FFMPEG_THREADS,
+            **codec_args
         )
         
-        # Execute the command, overwriting any existing file
+        # Execute the command, overwriting any existing files
         # 'capture_stdout=True' and 'capture_stderr=True' are crucial
         # to get error details if it fails.
         ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
         
-        print(f"[AudioService] Successfully prepared audio: {output_path}")
-        return output_path
+        # scandir yields names without stat-ing each entry or building a Path
+        # per match; only the sorted segment names are turned into Paths.
+        segment_prefix = f"{source_id}_"
+        segment_suffix = f".{OUTPUT_FORMAT}"
+        with os.scandir(segment_output_dir) as entries:
+            segment_names = sorted(
+                entry.name for entry in entries
+                if entry.name.startswith(segment_prefix) and entry.name.endswith(segment_suffix)
+            )
+        segment_paths = [segment_output_dir / name for name in segment_names]
+        print(f"[AudioService] Successfully created {len(segment_paths)} audio segments.")
+        return segment_paths
 
     except ffmpeg.Error as e:
         # If ffmpeg fails, log the detailed error message
@@ -80,48 +143,3 @@ def prepare_audio_for_transcription(
     except Exception as e:
         print(f"An unexpected error occurred during audio prep: {e}")
         raise AudioProcessingError(str(e))
-    
-    
-# app/services/audio.py (Add this function)
-
-# app/services/audio.py (Update the split_audio_file function)
-
-# app/services/audio.py
-# app/services/audio.py (Final split_audio_file function)
-
-def split_audio_file(input_path: Path, output_dir: Path, segment_duration_sec: int = 29) -> List[Path]:
-    """
-    Splits an audio file into smaller segments of 29 seconds maximum 
-    to strictly conform to the 30-second API limit.
-    """
-    segment_output_dir = output_dir / "segments"
-    segment_output_dir.mkdir(parents=True, exist_ok=True)
-    
-    print(f"[AudioService] Splitting audio into {segment_duration_sec}s segments (FINAL FIX)...")
-    
-    try:
-        output_pattern = str(segment_output_dir / f"{input_path.stem}_%03d.{input_path.suffix.lstrip('.')}")
-        
-        stream = ffmpeg.input(str(input_path))
-        
-        # Use strict flags to ensure compliance:
-        # -map 0:a: Ensure we ONLY process the audio stream
-        # -c:a libmp3lame: Force high-quality MP3 re-encode for compliance
-        stream = ffmpeg.output(
-            stream, 
-            output_pattern,
-            f='segment',
-            segment_time=segment_duration_sec,
-            map='0:a', 
-            c='libmp3lame', # FIX: Use 'c' instead of 'c:a'
-            ac=1, 
-            ar=16000 
-        )
-        ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
-        
-        return sorted(list(segment_output_dir.glob(f"{input_path.stem}_*.*")))
-        
-    except ffmpeg.Error as e:
-        error_message = e.stderr.decode() if e.stderr else "Unknown ffmpeg error during splitting"
-        print(f"FATAL: ffmpeg splitting failed: {error_message}")
-        raise AudioProcessingError(f"ffmpeg splitting error: {error_message}")
\ No newline at end of file
@@ -23,8 +23,18 @@ class EmbeddingService:
         # Load the model from HuggingFace
         self.model = SentenceTransformer(self.model_name, device=self.device)
         
+        # On GPU, run in FP16: half the memory bandwidth and tensor-core throughput
+        if self.device == 'cuda':
+            self.model = self.model.half()
+        
+        self.batch_size = settings.BATCH_EMBED_SIZE
+        
         # Get the embedding dimension from the model
         self.embedding_dim = self.model.get_sentence_embedding_dimension()
+        
+        # Run one throwaway encode so lazy kernel/graph initialization
+        # happens now rather than on the first real request
+        self.model.encode(["warmup"], show_progress_bar=False, device=self.device)
         print(f"[EmbeddingService] Model loaded. Embedding dimension: {self.embedding_dim}")
 
     def embed_texts(self, texts: List[str]) -> np.ndarray:
@@ -35,21 +45,49 @@ class EmbeddingService:
             texts: A list of strings to embed.
             
         Returns:
-            A numpy array of shape (num_texts, embedding_dim).
+            A C-contiguous float32 numpy array of shape (num_texts, embedding_dim)
+            with unit-length rows (what the vector store expects, so it never
+            has to copy it).
         """
         if not texts:
             return np.array([])
             
-        print(f"[EmbeddingService] Generating embeddings for {len(texts)} text chunks...")
+        # Encode each distinct text only once (repeated filler segments and
+        # identical frame captions are common), then fan the rows back out.
+        # `inverse[i]` is the row of unique_texts holding texts[i].
+        first_index = {}
+        inverse = np.fromiter(
+            (first_index.setdefault(text, len(first_index)) for text in texts),
+            dtype=np.intp,
+            count=len(texts)
+        )
+        unique_texts = list(first_index)
         
-        # We normalize embeddings to make cosine similarity search faster and simpler
+        print(f"[EmbeddingService] Generating embeddings for {len(texts)} text chunks ({len(unique_texts)} unique)...")
+        
+        # No need to sort texts by length here to reduce padding: encode()
+        # already length-sorts internally before batching and restores the
+        # original order, so each batch is padded to a near-minimal length.
+        # We normalize embeddings to unit length so the vector store can use
+        # plain inner product as cosine similarity (no per-query re-normalization)
         embeddings = self.model.encode(
-            texts, 
+            unique_texts, 
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
             show_progress_bar=False,
             normalize_embeddings=True,
             device=self.device
         )
         
+        # Fan the rows out before the float32 cast, so an FP16 model's output
+        # is copied at half width and only one full float32 array is allocated
+        if len(unique_texts) != len(texts):
+            embeddings = embeddings[inverse]
+        
+        # FAISS requires float32 (FP16 models return float16)
+        if embeddings.dtype != np.float32:
+            embeddings = embeddings.astype(np.float32)
+        
         print(f"[EmbeddingService] Embeddings generated with shape {embeddings.shape}")
         return embeddings
 
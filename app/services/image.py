@@ -1,16 +1,134 @@
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from google import genai
-from google.genai import types
-from PIL import Image
+from google.genai import errors, types
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
 from app.config import get_settings, LLMProvider # <--- THE FIX
 
+# --- Constants ---
+GEMINI_MODEL = "gemini-2.5-flash"
+
+# The prompt to guide the vision model
+GEMINI_PROMPT = (
+    "Provide a detailed, objective description of this video frame, "
+    "noting any text, diagrams, key people, or slide content. "
+    "Keep the description concise and factual."
+)
+
 class ImageProcessingError(Exception):
     """Custom exception for image processing failures."""
     pass
 
+# --- Singleton Gemini client ---
+# Created once per process so its HTTP connection pool (and keep-alive
+# connections) is reused across videos.
+
+_client: Optional[genai.Client] = None
+
+def _get_client() -> genai.Client:
+    """
+    Returns the process-wide Gemini client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        _client = genai.Client(api_key=get_settings().GOOGLE_API_KEY)
+    return _client
+
+def _is_retryable_gemini_error(e: BaseException) -> bool:
+    """Rate limiting (429) and temporary unavailability (503) are worth retrying."""
+    return isinstance(e, errors.APIError) and e.code in (429, 503)
+
+@retry(
+    retry=retry_if_exception(_is_retryable_gemini_error),
+    wait=wait_exponential(multiplier=1, max=20),
+    stop=stop_after_attempt(5),
+    reraise=True
+)
+def _analyze_one(client: genai.Client, frame_path: Path, prompt: str) -> Tuple[str, str]:
+    """
+    Describes a single frame with Gemini Vision.
+    
+    Returns:
+        A tuple of (frame filename, description).
+    """
+    print(f"[ImageService] Analyzing {frame_path.name}...")
+    
+    # Send the JPEG bytes as-is (no decode + re-encode through PIL)
+    img_part = types.Part.from_bytes(data=frame_path.read_bytes(), mime_type='image/jpeg')
+    
+    # Call the multimodal Gemini model
+    response = client.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=[prompt, img_part]
+    )
+    return frame_path.name, response.text.strip()
+
+@retry(
+    retry=retry_if_exception(_is_retryable_gemini_error),
+    wait=wait_exponential(multiplier=1, max=20),
+    stop=stop_after_attempt(5),
+    reraise=True
+)
+def _request_batch_descriptions(client: genai.Client, frame_paths: List[Path], prompt: str) -> List[str]:
+    """
+    Describes several frames with a single Gemini Vision call.
+    
+    Returns:
+        One description per frame, in the order of `frame_paths`.
+        
+    Raises:
+        ValueError: If the reply is not a JSON list with one string per frame.
+    """
+    batch_prompt = (
+        f"{prompt}\n\n"
+        f"You are given {len(frame_paths)} video frames, in order. "
+        f"Describe each frame independently and return a JSON array of exactly "
+        f"{len(frame_paths)} strings, where element i is the description of frame i."
+    )
+    contents: List = [batch_prompt]
+    for i, frame_path in enumerate(frame_paths):
+        contents.append(f"Frame {i + 1}:")
+        contents.append(types.Part.from_bytes(data=frame_path.read_bytes(), mime_type='image/jpeg'))
+    
+    response = client.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=contents,
+        config=types.GenerateContentConfig(response_mime_type="application/json")
+    )
+    
+    descriptions = json.loads(response.text)
+    if (
+        not isinstance(descriptions, list)
+        or len(descriptions) != len(frame_paths)
+        or not all(isinstance(d, str) for d in descriptions)
+    ):
+        raise ValueError(f"Expected a JSON array of {len(frame_paths)} descriptions")
+    return [d.strip() for d in descriptions]
+
+def _analyze_batch(client: genai.Client, frame_paths: List[Path], prompt: str) -> List[Tuple[str, str]]:
+    """
+    Describes a group of frames in one Gemini Vision call, falling back to
+    one call per frame if the batched reply cannot be parsed.
+    
+    Returns:
+        A list of (frame filename, description) tuples.
+    """
+    if len(frame_paths) == 1:
+        return [_analyze_one(client, frame_paths[0], prompt)]
+    
+    print(f"[ImageService] Analyzing {len(frame_paths)} frames from {frame_paths[0].name} in one request...")
+    try:
+        descriptions = _request_batch_descriptions(client, frame_paths, prompt)
+    except (ValueError, TypeError) as e:
+        print(f"[ImageService] Batched reply unusable ({e}), analyzing frames individually...")
+        return [_analyze_one(client, frame_path, prompt) for frame_path in frame_paths]
+    
+    return [(frame_path.name, description) for frame_path, description in zip(frame_paths, descriptions)]
+
 def analyze_frames_with_gemini(frames_dir: Path) -> Dict[str, str]:
     """
     Analyzes all images in a directory using Gemini Vision to generate captions/descriptions.
@@ -29,32 +147,27 @@ def analyze_frames_with_gemini(frames_dir: Path) -> Dict[str, str]:
     print(f"[ImageService] Analyzing frames in {frames_dir} using Gemini Vision...")
     
     try:
-        # Initialize the client (reusing existing API key setup)
-        client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+        # Reuse the process-wide client (and its open connections)
+        client = _get_client()
         
-        descriptions: Dict[str, str] = {}
         frame_files = sorted(list(frames_dir.glob("*.jpg")))
         
-        for frame_path in frame_files:
-            print(f"[ImageService] Analyzing {frame_path.name}...")
-            
-            # Open the image using PIL
-            img = Image.open(frame_path)
-            
-            # The prompt to guide the vision model
-            prompt = (
-                "Provide a detailed, objective description of this video frame, "
-                "noting any text, diagrams, key people, or slide content. "
-                "Keep the description concise and factual."
-            )
-            
-            # Call the multimodal Gemini model
-            response = client.models.generate_content(
-                model='gemini-2.5-flash',
-                contents=[prompt, img]
-            )
-            
-            descriptions[frame_path.name] = response.text.strip()
+        # Several frames are described per request (fewer round-trips), and
+        # the groups are independent, network-bound requests: run them concurrently
+        group_size = max(1, settings.GEMINI_FRAMES_PER_REQUEST)
+        frame_groups = [frame_files[i:i + group_size] for i in range(0, len(frame_files), group_size)]
+        
+        results: Dict[str, str] = {}
+        with ThreadPoolExecutor(max_workers=settings.GEMINI_CONCURRENCY) as executor:
+            futures = [executor.submit(_analyze_batch, client, group, GEMINI_PROMPT) for group in frame_groups]
+            for future in as_completed(futures):
+                for frame_name, description in future.result():
+                    results[frame_name] = description
+        
+        # Keep the descriptions in frame (chronological) order
+        descriptions: Dict[str, str] = {
+            frame_path.name: results[frame_path.name] for frame_path in frame_files
+        }
             
         print(f"[ImageService] Successfully generated {len(descriptions)} frame descriptions.")
         return descriptions
@@ -1,13 +1,15 @@
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 import numpy as np
 import uuid
 
 from app.api.schemas import IngestType, TaskStatus
 from app.config import get_settings
-from app.store.metadata_store import get_db, Document, TextChunk
-from app.services.audio import prepare_audio_for_transcription, split_audio_file
+from app.store.metadata_store import get_db, bulk_create_chunks, create_document, get_document_by_source_id, Document, TextChunk, TextChunkCreate
+from app.services.audio import prepare_and_split_audio
 from app.services.sarvam_client import get_sarvam_client
 from app.services.text_chunker import get_text_chunker
 from app.services.embedder import get_embedding_service
@@ -17,198 +19,383 @@ from app.services.image import analyze_frames_with_gemini
 
 # A helper to update task state (used by the orchestrator via task_self)
 def update_task_state(task, status: TaskStatus, details: str, progress: float = 0.0):
-    """Helper function to update Celery task state and metadata."""
+    """
+    Helper function to update Celery task state and metadata.
+    
+    Intermediate PROCESSING updates are throttled to one backend write per
+    TASK_STATE_MIN_INTERVAL_SEC; any other status, or 100% progress, is
+    always written. Must be called from the thread running the task
+    (task.request is thread-local).
+    """
+    request = task.request
+    # Called off the task's thread (e.g. from a transcription pool worker),
+    # request.id is None and Celery would store the state under the wrong
+    # key: such progress must be marshalled back to the task thread, as
+    # transcribe_audio does with as_completed.
+    if request.id is None:
+        print(f"[Orchestrator] Dropping task state update made outside the task thread: {details}")
+        return
+    
+    # Chord header stages (see ingest_video) report on the task ID the
+    # client polls instead of their own
+    target_task_id = getattr(request, 'progress_task_id', None) or request.id
+    
+    now = time.monotonic()
+    if status == TaskStatus.PROCESSING and progress < 100.0:
+        last_update_at = getattr(request, '_last_state_update_at', None)
+        if last_update_at is not None and now - last_update_at < get_settings().TASK_STATE_MIN_INTERVAL_SEC:
+            return
+    # Stored on the per-execution request context, so it never leaks across tasks
+    request._last_state_update_at = now
+    
+    if target_task_id != request.id:
+        # The header stages run in parallel and share one progress bar:
+        # never move it backwards
+        current = task.backend.get_task_meta(target_task_id).get('result')
+        if isinstance(current, dict) and current.get('progress_percent', 0.0) > progress:
+            return
+    
     meta = {
         'status': status.value,
         'details': details,
         'progress_percent': progress,
     }
-    task.update_state(state=status.value, meta=meta)
+    task.update_state(task_id=target_task_id, state=status.value, meta=meta)
 
-def process_audio_source(
-    task_self, # The Celery task instance passed here
+# --- Pipeline Stages ---
+# process_audio_source runs every stage in one task. Videos are instead split
+# into a Celery chord (see app/workers/tasks.py) whose tasks call the same
+# stages: transcribe_audio and describe_video_frames in parallel, then
+# index_video_document.
+
+def _create_document(
+    db,
     source_id: str,
     original_file_path: Path,
     file_name: str,
     doc_type: IngestType,
-    language: str
-) -> Dict[str, Any]:
+    content_hash: Optional[str]
+) -> Document:
     """
-    The main processing pipeline for any file with an audio track (AUDIO or VIDEO).
-    Handles segmentation, transcription, chunking, and embedding.
+    Step 1: returns the Document record (status 'processing') that the
+    /ingest API registered for this source_id before dispatching the task,
+    or creates and commits it for tasks queued without one.
+    """
+    doc = get_document_by_source_id(db, source_id)
+    if doc is not None:
+        return doc
+    
+    print(f"[Orchestrator] Creating document record for {source_id}")
+    # Commit the document immediately to save the source_id and prevent integrity errors on failure
+    return create_document(db, source_id, file_name, doc_type, str(original_file_path), content_hash)
+
+def _mark_failed(db, doc: Document):
+    """Rolls back any partial work and marks the document as failed."""
+    db.rollback()
+    doc.status = "failed"
+    db.add(doc)
+    db.commit()
+
+def transcribe_audio(
+    task_self,
+    source_id: str,
+    original_file_path: Path,
+    language: str
+) -> Tuple[Dict[str, Any], Path]:
     """
+    Steps 2-4: extracts and segments the audio, transcribes the segments
+    with Sarvam and saves the combined transcript as JSON.
     
-    # Get all singleton services
+    Returns:
+        The transcript data ({"transcript", "segments"}) and its file path.
+    """
     settings = get_settings()
     sarvam_client = get_sarvam_client()
+    
+    # --- 2-3. Prepare & Segment Audio (single FFmpeg pass) ---
+    # Use 29 seconds to strictly adhere to the API's 30s limit
+    update_task_state(task_self, TaskStatus.PROCESSING, "Extracting audio and splitting for API limits...", 10.0)
+    segment_paths = prepare_and_split_audio(
+        input_path=original_file_path,
+        output_dir=settings.TRANSCRIPT_DIR,
+        source_id=source_id,
+        segment_duration_sec=29
+    )
+    if not segment_paths:
+        raise Exception("Audio was extracted, but no segments were created.")
+
+    # --- 4. Transcribe Segments (Sarvam) & Combine (Full Loop) ---
+    update_task_state(task_self, TaskStatus.PROCESSING, f"Transcribing {len(segment_paths)} segments (Sarvam)...", 40.0)
+    
+    # Segment texts are collected and joined once at the end
+    transcript_parts: List[str] = []
+    combined_segments = []
+    
+    # Each segment is an independent HTTP request (I/O bound, releases
+    # the GIL), so transcribe them concurrently with a bounded pool.
+    segment_count = len(segment_paths)
+    
+    def transcribe_segment(segment_path: Path) -> Dict[str, Any]:
+        return sarvam_client.transcribe_audio_file(
+            file_path=segment_path,
+            language_code=language
+        )
+    
+    max_workers = min(settings.SARVAM_MAX_CONCURRENCY, segment_count)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(transcribe_segment, path) for path in segment_paths]
+        
+        # Update progress for user feedback as segments finish.
+        # This runs on the task's own thread: task.request is
+        # thread-local, so pool threads can't report state.
+        for completed_segments, _ in enumerate(as_completed(futures), start=1):
+            progress = 40.0 + (completed_segments / segment_count) * 10.0
+            update_task_state(task_self, TaskStatus.PROCESSING, f"Transcribed segment {completed_segments}/{segment_count}...", progress)
+        
+        # Collect in submission order to keep the transcript in sequence
+        for future in futures:
+            segment_transcript_data = future.result()
+            
+            # Combine results
+            segment_text = segment_transcript_data.get('transcript', '')
+            if segment_text:
+                transcript_parts.append(segment_text)
+                combined_segments.extend(segment_transcript_data.get('segments', [{'text': segment_text, 'start': 0.0, 'end': 0.0}]))
+    
+    transcript_data = {"transcript": " ".join(transcript_parts).strip(), "segments": combined_segments}
+    
+    # Save the raw combined transcript
+    transcript_path = settings.TRANSCRIPT_DIR / f"{source_id}_transcript.json"
+    with open(transcript_path, 'w', encoding='utf-8') as f:
+        json.dump(transcript_data, f, ensure_ascii=False, indent=2)
+    
+    return transcript_data, transcript_path
+
+def _frames_dir(source_id: str) -> Path:
+    """The directory a video's extracted frames are written to."""
+    frames_output_dir = get_settings().FRAME_DIR / source_id
+    frames_output_dir.mkdir(parents=True, exist_ok=True)
+    return frames_output_dir
+
+def describe_video_frames(task_self, source_id: str, original_file_path: Path) -> Dict[str, str]:
+    """
+    Steps 6a-6b: extracts key frames and describes them with Gemini Vision.
+    
+    Returns:
+        A dictionary mapping frame filename to its description, in frame order.
+    """
+    update_task_state(task_self, TaskStatus.PROCESSING, "Extracting video frames...", 60.0)
+    frames_output_dir = _frames_dir(source_id)
+    extract_key_frames(original_file_path, frames_output_dir)
+    
+    update_task_state(task_self, TaskStatus.PROCESSING, "Analyzing frames with Gemini Vision...", 70.0)
+    return analyze_frames_with_gemini(frames_output_dir)
+
+def _index_document(
+    task_self,
+    db,
+    doc: Document,
+    transcript_data: Dict[str, Any],
+    frame_descriptions: Dict[str, str],
+    artifacts: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Steps 5, 6c and 7: chunks the transcript, embeds the chunks and frame
+    descriptions, links them in the metadata DB and marks the document
+    completed. Returns `artifacts` with the final counts added.
+    """
     text_chunker = get_text_chunker()
     embed_service = get_embedding_service()
     vector_store = get_vector_store()
     
+    # --- 5. Chunk Transcript ---
+    update_task_state(task_self, TaskStatus.PROCESSING, "Chunking transcript...", 80.0)
+    chunks_with_times = text_chunker.chunk_transcript(transcript_data)
+    
+    if not chunks_with_times:
+        raise Exception("Transcript was empty or could not be chunked.")
+        
+    text_chunks = [chunk[0] for chunk in chunks_with_times]
+    frame_texts = list(frame_descriptions.values())
+    
+    # --- 6c. Embed Transcript Chunks & Frame Descriptions ---
+    # One embed_texts call and one FAISS add for both sets (one model
+    # pass, fuller batches, one index insert); the assigned IDs are
+    # split back by position.
+    update_task_state(task_self, TaskStatus.PROCESSING, "Embedding transcript and frame descriptions...", 85.0)
+    all_vectors = embed_service.embed_texts(text_chunks + frame_texts)
+    all_vector_ids = vector_store.add_vectors(all_vectors)
+    vector_ids = all_vector_ids[:len(text_chunks)]
+    frame_vector_ids = all_vector_ids[len(text_chunks):]
+    
+    # Link Text Chunks to Metadata DB (SQL)
+    # All rows go in with one executemany INSERT (no per-object
+    # unit-of-work/identity-map bookkeeping).
+    new_chunk_records = []
+    for i, chunk_data in enumerate(chunks_with_times):
+        text, start, end = chunk_data
+        vector_id = int(vector_ids[i])
+        
+        new_chunk_records.append(TextChunkCreate(
+            vector_id=vector_id,
+            text_content=text,
+            start_time=start,
+            end_time=end
+        ))
+    
+    # Link Frame Descriptions
+    new_frame_chunk_records = []
+    if frame_texts:
+        frame_filenames = list(frame_descriptions.keys())
+
+        for i, text in enumerate(frame_texts):
+            frame_filename = frame_filenames[i]
+            # Time extraction
+            try:
+                time_sec = float(frame_filename.split('_')[-1].replace('s.jpg', ''))
+            except ValueError:
+                time_sec = 0.0
+
+            new_frame_chunk_records.append(TextChunkCreate(
+                vector_id=int(frame_vector_ids[i]),
+                text_content=text,
+                start_time=time_sec,
+                end_time=time_sec
+            ))
+            
+        artifacts['visual_count'] = len(frame_vector_ids)
+    
+    bulk_create_chunks(db, doc.id, new_chunk_records + new_frame_chunk_records)
+    
+    # --- 7. Finalize and Commit ---
+    update_task_state(task_self, TaskStatus.PROCESSING, "Saving index and finalizing record...", 95.0)
+    
+    # Persist the vectors *before* the document is committed as completed:
+    # a completed document is never re-ingested, so its vectors must not
+    # exist only in this process's memory (a crash would leave its chunks
+    # pointing at vector IDs that later adds reuse).
+    vector_store.save_index()
+    
+    doc.status = "completed"
+    db.commit()
+    
+    # Final artifact counts
+    artifacts['document_id'] = doc.id
+    artifacts['vector_count'] = vector_store.index.ntotal 
+    artifacts['metadata_count'] = len(new_chunk_records) + artifacts.get('visual_count', 0)
+    
+    print(f"[Orchestrator] Successfully processed {doc.source_id}.")
+    return artifacts
+
+def get_completed_ingest_artifacts(source_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Idempotency guard: if `source_id` was already ingested successfully
+    (e.g. a redelivered task), returns its artifacts instead of None, so the
+    caller can skip re-transcribing and re-adding its vectors to FAISS.
+    """
+    with get_db() as db:
+        doc = get_document_by_source_id(db, source_id)
+        if doc is None or doc.status != "completed":
+            return None
+        chunk_count = db.query(TextChunk).filter(TextChunk.document_id == doc.id).count()
+    
+    print(f"[Orchestrator] {source_id} was already ingested; skipping.")
+    return {'already_ingested': True, 'document_id': doc.id, 'metadata_count': chunk_count}
+
+def process_audio_source(
+    task_self, # The Celery task instance passed here
+    source_id: str,
+    original_file_path: Path,
+    file_name: str,
+    doc_type: IngestType,
+    language: str,
+    content_hash: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    The main processing pipeline for an AUDIO file, run entirely within one
+    task. (Videos run the same stages as a Celery chord, see ingest_video.)
+    Handles segmentation, transcription, chunking, and embedding.
+    
+    `content_hash` (SHA-256 of the upload) is stored on the document so
+    identical uploads can be de-duplicated by the API.
+    """
+    # Never ingest the same source twice
+    cached_artifacts = get_completed_ingest_artifacts(source_id)
+    if cached_artifacts is not None:
+        return cached_artifacts
+    
     artifacts: Dict[str, Any] = {}
     
     with get_db() as db:
         
         # --- 1. Create Document Record ---
-        print(f"[Orchestrator] Creating document record for {source_id}")
-        doc = Document(
-            source_id=source_id,
-            source_file_name=file_name,
-            doc_type=doc_type,
-            storage_path=str(original_file_path),
-            status="processing"
-        )
-        db.add(doc)
-        # Commit the document immediately to save the source_id and prevent integrity errors on failure
-        db.commit() 
-        db.refresh(doc)
+        doc = _create_document(db, source_id, original_file_path, file_name, doc_type, content_hash)
         
         try:
-            # --- 2. Prepare Audio (FFmpeg) ---
-            update_task_state(task_self, TaskStatus.PROCESSING, "Extracting/Standardizing audio...", 10.0)
-            prepared_audio_path = prepare_audio_for_transcription(
-                input_path=original_file_path,
-                output_dir=settings.TRANSCRIPT_DIR,
-                source_id=source_id
-            )
-            
-            # --- 3. Segment Audio (FIX for 30s limit) ---
-            update_task_state(task_self, TaskStatus.PROCESSING, "Splitting audio for API limits...", 20.0)
-            # Use 29 seconds to strictly adhere to the API's 30s limit
-            segment_paths = split_audio_file(
-                prepared_audio_path,
-                settings.TRANSCRIPT_DIR,
-                segment_duration_sec=29 
-            )
-            if not segment_paths:
-                raise Exception("Audio file was split, but no segments were created.")
-
-            # --- 4. Transcribe Segments (Sarvam) & Combine (Full Loop) ---
-            update_task_state(task_self, TaskStatus.PROCESSING, f"Transcribing {len(segment_paths)} segments (Sarvam)...", 40.0)
-            
-            full_transcript_text = ""
-            combined_segments = []
-            
-            for i, segment_path in enumerate(segment_paths):
-                # Update progress for user feedback
-                progress = 40.0 + (i / len(segment_paths)) * 10.0
-                update_task_state(task_self, TaskStatus.PROCESSING, f"Transcribing segment {i+1}/{len(segment_paths)}...", progress)
-                
-                segment_transcript_data = sarvam_client.transcribe_audio_file(
-                    file_path=segment_path,
-                    language_code=language
-                )
-                
-                # Combine results
-                segment_text = segment_transcript_data.get('transcript', '')
-                if segment_text:
-                    full_transcript_text += segment_text + " "
-                    combined_segments.extend(segment_transcript_data.get('segments', [{'text': segment_text, 'start': 0.0, 'end': 0.0}]))
-            
-            transcript_data = {"transcript": full_transcript_text.strip(), "segments": combined_segments}
-            
-            # Save the raw combined transcript
-            transcript_path = settings.TRANSCRIPT_DIR / f"{source_id}_transcript.json"
-            with open(transcript_path, 'w', encoding='utf-8') as f:
-                json.dump(transcript_data, f, ensure_ascii=False, indent=2)
-            
+            # --- 2-4. Prepare, Segment & Transcribe Audio ---
+            transcript_data, transcript_path = transcribe_audio(task_self, source_id, original_file_path, language)
             artifacts['transcript_path'] = str(transcript_path)
             
-            # --- 5. Chunk Transcript & Embed Text ---
-            update_task_state(task_self, TaskStatus.PROCESSING, "Chunking and embedding transcript...", 55.0)
-            chunks_with_times = text_chunker.chunk_transcript(transcript_data)
-            
-            if not chunks_with_times:
-                raise Exception("Transcript was empty or could not be chunked.")
-                
-            text_chunks = [chunk[0] for chunk in chunks_with_times]
-            vectors = embed_service.embed_texts(text_chunks)
-            vector_ids = vector_store.add_vectors(vectors)
-            
-            # Link Text Chunks to Metadata DB (SQL)
-            new_chunk_records = []
-            for i, chunk_data in enumerate(chunks_with_times):
-                text, start, end = chunk_data
-                vector_id = int(vector_ids[i])
-                
-                db_chunk = TextChunk(
-                    document_id=doc.id,
-                    vector_id=vector_id,
-                    text_content=text,
-                    start_time=start,
-                    end_time=end
-                )
-                new_chunk_records.append(db_chunk)
-            
-            db.add_all(new_chunk_records)
-            
-            # --- 6. Video Frame Analysis (Multimodal Step) ---
-            if doc_type == IngestType.VIDEO:
-                update_task_state(task_self, TaskStatus.PROCESSING, "Extracting video frames...", 70.0)
-                
-                # 6a. Extract Frames
-                frames_output_dir = settings.FRAME_DIR / source_id
-                frames_output_dir.mkdir(parents=True, exist_ok=True)
-                
-                extract_key_frames(original_file_path, frames_output_dir)
-                artifacts['frames_dir'] = str(frames_output_dir)
-                
-                # 6b. Analyze Frames (Gemini Vision)
-                update_task_state(task_self, TaskStatus.PROCESSING, "Analyzing frames with Gemini Vision...", 80.0)
-                frame_descriptions = analyze_frames_with_gemini(frames_output_dir)
-                
-                # 6c. Embed Frame Descriptions and Link
-                frame_texts = list(frame_descriptions.values())
-                
-                if frame_texts:
-                    frame_vectors = embed_service.embed_texts(frame_texts)
-                    frame_vector_ids = vector_store.add_vectors(frame_vectors)
-                    
-                    new_frame_chunk_records = []
-                    frame_filenames = list(frame_descriptions.keys())
-
-                    for i, text in enumerate(frame_texts):
-                        frame_filename = frame_filenames[i]
-                        # Time extraction
-                        try:
-                            time_sec = float(frame_filename.split('_')[-1].replace('s.jpg', ''))
-                        except ValueError:
-                            time_sec = 0.0
-
-                        db_chunk = TextChunk(
-                            document_id=doc.id,
-                            vector_id=int(frame_vector_ids[i]),
-                            text_content=text,
-                            start_time=time_sec,
-                            end_time=time_sec
-                        )
-                        new_frame_chunk_records.append(db_chunk)
-                        
-                    db.add_all(new_frame_chunk_records)
-                    artifacts['visual_count'] = len(frame_vector_ids)
-            
-            # --- 7. Finalize and Commit ---
-            update_task_state(task_self, TaskStatus.PROCESSING, "Saving index and finalizing record...", 95.0)
-            
-            doc.status = "completed"
-            db.commit()
-            vector_store.save_index()
-            
-            # Final artifact counts
-            artifacts['vector_count'] = vector_store.index.ntotal 
-            artifacts['metadata_count'] = len(new_chunk_records) + artifacts.get('visual_count', 0)
-            
-            print(f"[Orchestrator] Successfully processed {source_id}.")
-            return artifacts
+            # --- 5, 6c, 7. Chunk, Embed, Link & Commit ---
+            return _index_document(task_self, db, doc, transcript_data, {}, artifacts)
 
         except Exception as e:
             # --- Error Handling ---
             print(f"[Orchestrator] FAILED processing for {source_id}: {e}")
-            db.rollback()
-            doc.status = "failed"
-            db.add(doc)
-            db.commit()
+            _mark_failed(db, doc)
             raise
+
+# --- Video Chord Entry Points ---
+
+def create_video_document(
+    source_id: str,
+    original_file_path: Path,
+    file_name: str,
+    content_hash: Optional[str] = None
+):
+    """
+    Step 1 for the chord-based video pipeline: records the document before
+    its audio and frame tasks are dispatched.
+    """
+    with get_db() as db:
+        _create_document(db, source_id, original_file_path, file_name, IngestType.VIDEO, content_hash)
+
+def index_video_document(
+    task_self,
+    source_id: str,
+    transcript_path: str,
+    frame_descriptions: Dict[str, str]
+) -> Dict[str, Any]:
+    """
+    Final stage of the chord-based video pipeline: indexes the transcript
+    (saved by the audio task) together with the frame descriptions.
+    """
+    with open(transcript_path, 'r', encoding='utf-8') as f:
+        transcript_data = json.load(f)
+    
+    artifacts: Dict[str, Any] = {
+        'transcript_path': transcript_path,
+        'frames_dir': str(get_settings().FRAME_DIR / source_id)
+    }
+    
+    with get_db() as db:
+        doc = get_document_by_source_id(db, source_id)
+        if doc is None:
+            raise Exception(f"No document record for {source_id}.")
+        try:
+            return _index_document(task_self, db, doc, transcript_data, frame_descriptions, artifacts)
+        except Exception as e:
+            print(f"[Orchestrator] FAILED indexing for {source_id}: {e}")
+            _mark_failed(db, doc)
+            raise
+
+def mark_document_failed(source_id: str):
+    """Marks a document as failed (e.g. when one of its chord tasks failed)."""
+    with get_db() as db:
+        doc = get_document_by_source_id(db, source_id)
+        if doc is not None and doc.status != "failed":
+            print(f"[Orchestrator] Marking {source_id} as failed.")
+            _mark_failed(db, doc)
         
 # app/services/ingestion_orchestrator.py (Add this function definition)
 
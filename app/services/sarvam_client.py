@@ -1,3 +1,4 @@
+import mimetypes
 from pathlib import Path
 from typing import Dict, Any, Optional
 from app.config import Settings, get_settings
@@ -47,13 +48,19 @@ class SarvamClient:
         print(f"[SarvamClient] Submitting {file_path.name} for transcription...")
 
         try:
-            with open(file_path, "rb") as audio_file:
-                # Call the Sarvam SDK
-                response = self.client.speech_to_text.transcribe(
-                    file=audio_file,
-                    model="saarika:v2.5",       # From their docs
-                    language_code=language_code # e.g., 'hi-IN'
-                )
+            # Segments are small (~30s), so read each one in a single call and
+            # hand the SDK the bytes as a (filename, content, content_type)
+            # tuple: no read loop or extra buffering, and no file handle held
+            # open for the duration of the upload.
+            content_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+            audio_file = (file_path.name, file_path.read_bytes(), content_type)
+            
+            # Call the Sarvam SDK
+            response = self.client.speech_to_text.transcribe(
+                file=audio_file,
+                model="saarika:v2.5",       # From their docs
+                language_code=language_code # e.g., 'hi-IN'
+            )
             
             # The SDK returns a Pydantic model. Convert it to a dict
             # for standard JSON serialization in our system.
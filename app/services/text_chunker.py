@@ -1,5 +1,10 @@
+import re
+from bisect import bisect_left, bisect_right
 from typing import List, Optional, Tuple
 
+# A sentence break, as used to pick the overlap point between chunks
+SENTENCE_BREAK = re.compile(r"\. ")
+
 class TextChunker:
     """
     A simple text chunker designed for transcripts and documents.
@@ -37,31 +42,47 @@ class TextChunker:
             return [] # No content
             
         chunks = []
-        current_chunk = ""
+        # The current chunk is accumulated as a list of pieces (joined once
+        # per chunk) to avoid quadratic string concatenation.
+        current_parts: List[str] = []
+        current_len = 0
+        # Offsets of every sentence break in the current chunk, recorded once
+        # as each paragraph is added, so the overlap point is a binary search
+        # instead of a rescan of the chunk on every flush.
+        current_breaks: List[int] = []
 
         # 2. Combine paragraphs into chunks of the desired size
         for paragraph in paragraphs:
             # If adding the next paragraph fits, add it
-            if len(current_chunk) + len(paragraph) + 1 <= self.chunk_size:
-                current_chunk += paragraph + "\n\n"
+            if current_len + len(paragraph) + 1 <= self.chunk_size:
+                current_breaks.extend(current_len + m.start() for m in SENTENCE_BREAK.finditer(paragraph))
+                current_parts.append(paragraph + "\n\n")
+                current_len += len(paragraph) + 2
             
             # If the current chunk is empty but the paragraph is too big,
             # we must split the paragraph itself.
-            elif not current_chunk and len(paragraph) > self.chunk_size:
+            elif not current_len and len(paragraph) > self.chunk_size:
                 chunks.extend(self._split_long_paragraph(paragraph))
                 
             # If the paragraph makes the chunk too big, finalize the
             # current chunk and start a new one.
             else:
+                current_chunk = "".join(current_parts)
                 chunks.append(current_chunk.strip())
                 
-                # Start the new chunk with an overlap
-                overlap_text = self._get_overlap(current_chunk)
-                current_chunk = overlap_text + paragraph + "\n\n"
+                # Start the new chunk with an overlap; the breaks inside the
+                # overlap carry over, shifted to the new chunk's start.
+                overlap_start = self._get_overlap_start(current_chunk, current_breaks)
+                overlap_text = current_chunk[overlap_start:]
+                current_breaks = [b - overlap_start for b in current_breaks[bisect_left(current_breaks, overlap_start):]]
+                current_len = len(overlap_text)
+                current_breaks.extend(current_len + m.start() for m in SENTENCE_BREAK.finditer(paragraph))
+                current_parts = [overlap_text, paragraph + "\n\n"]
+                current_len += len(paragraph) + 2
 
         # Add the last remaining chunk
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if current_len:
+            chunks.append("".join(current_parts).strip())
             
         return chunks
 
@@ -72,38 +93,46 @@ class TextChunker:
             return [paragraph] # Can't split further
 
         mini_chunks = []
-        current_mini_chunk = ""
+        current_sentences: List[str] = []
+        current_len = 0
         for sentence in sentences:
-            if len(current_mini_chunk) + len(sentence) + 2 <= self.chunk_size:
-                current_mini_chunk += sentence + ". "
-            elif not current_mini_chunk: # Sentence itself is too long
+            if current_len + len(sentence) + 2 <= self.chunk_size:
+                current_sentences.append(sentence)
+                current_len += len(sentence) + 2
+            elif not current_len: # Sentence itself is too long
                 mini_chunks.append(sentence + ".")
             else:
-                mini_chunks.append(current_mini_chunk.strip())
-                current_mini_chunk = sentence + ". "
+                mini_chunks.append(". ".join(current_sentences) + ".")
+                current_sentences = [sentence]
+                current_len = len(sentence) + 2
         
-        if current_mini_chunk:
-            mini_chunks.append(current_mini_chunk.strip())
+        if current_sentences:
+            mini_chunks.append(". ".join(current_sentences) + ".")
             
         return mini_chunks
 
-    def _get_overlap(self, chunk: str) -> str:
-        """Gets the last ~N characters from a chunk to use as overlap."""
+    def _get_overlap_start(self, chunk: str, sentence_breaks: List[int]) -> int:
+        """
+        Gets the offset where the last ~N characters of a chunk, used as
+        overlap, begin. `sentence_breaks` holds the sorted offsets of every
+        ". " in the chunk.
+        """
         # Find the nearest sentence break to the overlap point
         overlap_point = max(0, len(chunk) - self.chunk_overlap)
         
         # Try to find a sentence end before the overlap point
-        sentence_end = chunk.rfind(". ", 0, overlap_point)
-        if sentence_end != -1:
-            return chunk[sentence_end + 2:] # Return text after the period
+        # (the last break that fits entirely before it)
+        i = bisect_right(sentence_breaks, overlap_point - 2)
+        if i:
+            return sentence_breaks[i - 1] + 2 # Start after the period
         
         # If no sentence, find a word break
         word_break = chunk.rfind(" ", 0, overlap_point + 10)
         if word_break != -1:
-            return chunk[word_break + 1:]
+            return word_break + 1
             
         # If all else fails, just take the raw character overlap
-        return chunk[overlap_point:]
+        return overlap_point
 
     def chunk_transcript(self, transcript_data: dict) -> List[Tuple[str, float, float]]:
         """
@@ -124,7 +153,8 @@ class TextChunker:
             return [(chunk, 0.0, 0.0) for chunk in self.chunk_text(full_text)]
 
         chunks = []
-        current_chunk_text = ""
+        current_texts: List[str] = []
+        current_len = 0
         current_start_time = segments[0].get("start", 0.0)
         current_end_time = 0.0
 
@@ -133,22 +163,24 @@ class TextChunker:
             segment_start = segment.get("start", current_end_time)
             segment_end = segment.get("end", segment_start)
 
-            if len(current_chunk_text) + len(segment_text) + 1 <= self.chunk_size:
+            if current_len + len(segment_text) + 1 <= self.chunk_size:
                 # Add to current chunk
-                current_chunk_text += segment_text + " "
+                current_texts.append(segment_text)
+                current_len += len(segment_text) + 1
                 current_end_time = segment_end
             else:
                 # Finalize the current chunk
-                chunks.append((current_chunk_text.strip(), current_start_time, current_end_time))
+                chunks.append((" ".join(current_texts).strip(), current_start_time, current_end_time))
                 
                 # Start new chunk
-                current_chunk_text = segment_text + " "
+                current_texts = [segment_text]
+                current_len = len(segment_text) + 1
                 current_start_time = segment_start
                 current_end_time = segment_end
         
         # Add the final chunk
-        if current_chunk_text:
-            chunks.append((current_chunk_text.strip(), current_start_time, current_end_time))
+        if current_texts:
+            chunks.append((" ".join(current_texts).strip(), current_start_time, current_end_time))
             
         return chunks
 
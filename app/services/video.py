@@ -1,11 +1,79 @@
 import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 from app.config import get_settings
 
+try:
+    import simplejpeg
+except ImportError:
+    print("simplejpeg not found, falling back to OpenCV JPEG encoding. Please run: pip install simplejpeg")
+    simplejpeg = None
+
+# --- Constants ---
+# Frames are only used as Gemini Vision input, so 85 keeps them readable
+# while encoding faster and uploading smaller files.
+JPEG_QUALITY = 85
+
 class VideoProcessingError(Exception):
     """Custom exception for video processing failures."""
     pass
 
+def _encode_jpeg(frame: np.ndarray) -> bytes:
+    """Encodes a BGR frame (as returned by OpenCV) to JPEG bytes."""
+    if simplejpeg is not None:
+        # Direct libjpeg-turbo bindings: cheaper per frame than imgcodecs
+        return simplejpeg.encode_jpeg(frame, quality=JPEG_QUALITY, colorspace='BGR', fastdct=True)
+    
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise VideoProcessingError("Could not encode frame as JPEG.")
+    return buffer.tobytes()
+
+def _downscale(frame: np.ndarray, max_side: int) -> np.ndarray:
+    """Shrinks a frame (keeping its aspect ratio) so its longer side is at most `max_side`."""
+    height, width = frame.shape[:2]
+    scale = max_side / max(height, width)
+    if max_side <= 0 or scale >= 1.0:
+        return frame
+    return cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+def _phash(frame: np.ndarray) -> int:
+    """
+    Computes a 64-bit perceptual hash of a BGR frame: the sign pattern of the
+    lowest 8x8 DCT frequencies of a 32x32 grayscale thumbnail, relative to
+    their median. Near-identical frames get hashes a few bits apart.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low_freq = cv2.dct(thumbnail)[:8, :8]
+    bits = (low_freq > np.median(low_freq)).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def _encode_and_write(frame: np.ndarray, frame_output_path: Path):
+    """Encodes a frame and writes it to disk (runs on the encode pool)."""
+    frame_output_path.write_bytes(_encode_jpeg(frame))
+
+def _open_capture(input_path: Path, hw_acceleration: bool) -> cv2.VideoCapture:
+    """
+    Opens a video with OpenCV's FFmpeg backend, requesting hardware decoding
+    when enabled. Falls back to the default (CPU) decoder if no accelerated
+    decoder can open the file.
+    """
+    if hw_acceleration:
+        cap = cv2.VideoCapture(
+            str(input_path),
+            cv2.CAP_FFMPEG,
+            [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY, cv2.CAP_PROP_HW_DEVICE, 0]
+        )
+        if cap.isOpened():
+            return cap
+        cap.release()
+        print(f"[VideoService] Hardware decoding unavailable for {input_path.name}, using CPU decoder.")
+    
+    return cv2.VideoCapture(str(input_path))
+
 def extract_key_frames(input_path: Path, output_dir: Path) -> Path:
     """
     Extracts frames from a video at a fixed interval and saves them as JPEGs.
@@ -23,44 +91,85 @@ def extract_key_frames(input_path: Path, output_dir: Path) -> Path:
     print(f"[VideoService] Extracting frames from {input_path.name} every {interval} seconds...")
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    cap = cv2.VideoCapture(str(input_path))
+    cap = _open_capture(input_path, settings.VIDEO_HW_ACCELERATION)
     if not cap.isOpened():
         raise VideoProcessingError(f"Could not open video file: {input_path}")
         
-    # Get the frame rate and total number of frames
+    # Get the frame rate and total number of frames (probed once, up front)
     fps = cap.get(cv2.CAP_PROP_FPS)
     if fps <= 0:
         raise VideoProcessingError("Could not determine video frame rate (FPS).")
+    # Containers without a frame count report 0 (or garbage < 0): those are
+    # read until grab() hits EOF instead.
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
     # Calculate the number of frames to skip per interval
-    frame_skip = int(fps * interval)
+    frame_skip = max(1, int(fps * interval))
     frame_count = 0
+    next_keep = 0 # Index of the next frame to sample
     frames_extracted = 0
+    
+    # Near-duplicate suppression (static scenes, talking heads): a sampled
+    # frame too close to the last kept one is not saved, so it is never
+    # sent to Gemini, embedded or indexed.
+    dedup_distance = settings.VIDEO_FRAME_DEDUP_DISTANCE
+    
+    # Frames only feed Gemini Vision, which tiles images at 768x768; anything
+    # larger just costs hashing, JPEG encode, disk and upload bandwidth.
+    max_side = settings.VIDEO_FRAME_MAX_SIDE
+    last_kept_hash: Optional[int] = None
+    frames_skipped = 0
 
-    while True:
-        # Set the current frame position
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count)
-        
-        ret, frame = cap.read()
-        
-        if not ret:
-            # End of video stream
-            break
+    # Read the stream sequentially instead of seeking to every sample:
+    # a seek makes the decoder jump back to the previous keyframe and
+    # re-decode up to the target. grab() advances one frame without the
+    # BGR conversion; retrieve() only materializes the frames we keep.
+    # JPEG encode + write run on a small pool so decoding never waits on them
+    # (both OpenCV decode and libjpeg release the GIL).
+    # The loop stops at the probed frame count rather than relying on EOF
+    # detection alone, which on some containers probes to the end of the file.
+    futures = []
+    try:
+        with ThreadPoolExecutor(max_workers=settings.VIDEO_FRAME_ENCODE_WORKERS) as executor:
+            while (total_frames <= 0 or frame_count < total_frames) and cap.grab():
+                if frame_count == next_keep:
+                    next_keep += frame_skip
+                    
+                    # retrieve() without an output argument returns a freshly
+                    # allocated array, so it is safe to hand to another thread
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    
+                    frame = _downscale(frame, max_side)
+                    
+                    if dedup_distance > 0:
+                        frame_hash = _phash(frame)
+                        if last_kept_hash is not None and bin(frame_hash ^ last_kept_hash).count("1") <= dedup_distance:
+                            frames_skipped += 1
+                            frame_count += 1
+                            continue
+                        last_kept_hash = frame_hash
+                        
+                    # Get timestamp in seconds for the saved frame
+                    current_time_sec = frame_count / fps
+                    
+                    # Construct output file name
+                    frame_filename = f"frame_{frames_extracted:04d}_{int(current_time_sec)}s.jpg"
+                    frame_output_path = output_dir / frame_filename
+                    
+                    # Save the frame
+                    futures.append(executor.submit(_encode_and_write, frame, frame_output_path))
+                    
+                    frames_extracted += 1
+                    
+                frame_count += 1
             
-        # Get timestamp in seconds for the saved frame
-        current_time_sec = frame_count / fps
-        
-        # Construct output file name
-        frame_filename = f"frame_{frames_extracted:04d}_{int(current_time_sec)}s.jpg"
-        frame_output_path = output_dir / frame_filename
-        
-        # Save the frame
-        cv2.imwrite(str(frame_output_path), frame)
-        
-        frames_extracted += 1
-        frame_count += frame_skip
-        
-    cap.release()
+            # Surface any encode/write error
+            for future in futures:
+                future.result()
+    finally:
+        cap.release()
     
-    print(f"[VideoService] Extracted {frames_extracted} keyframes to {output_dir}")
+    print(f"[VideoService] Extracted {frames_extracted} keyframes to {output_dir} ({frames_skipped} near-duplicates skipped)")
     return output_dir
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, ForeignKey, Enum as SqlEnum, DateTime
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, Text, ForeignKey, Enum as SqlEnum, DateTime, inspect, text
 from sqlalchemy.orm import sessionmaker, relationship, Session
 from sqlalchemy.ext.declarative import declarative_base
 from contextlib import contextmanager
@@ -6,21 +6,40 @@ from datetime import datetime
 from pydantic import BaseModel
 from typing import List, Optional
 import uuid  # <-- ADD THIS LINE
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload, raiseload
 from app.config import settings 
 from app.api.schemas import IngestType # Use the same enum from your API
 
 # --- SQLAlchemy Setup ---
 
 # Use connect_args for SQLite only, as it's needed for Celery compatibility
-connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
+# (timeout: wait for a concurrent writer's lock instead of failing immediately)
+IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+connect_args = {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_SEC} if IS_SQLITE else {}
 
 engine = create_engine(
     settings.DATABASE_URL,
     connect_args=connect_args,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=True, # Replace connections the server dropped instead of erroring
     pool_recycle=3600 # Recycle connections every hour
 )
 
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        WAL lets the API read while a worker writes, and synchronous=NORMAL
+        skips the fsync per commit that WAL makes unnecessary for durability
+        of the database file.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 # SessionLocal is the factory for new database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -42,6 +61,7 @@ class Document(Base):
     doc_type = Column(SqlEnum(IngestType), nullable=False)
     storage_path = Column(String) # Path to the *original* file
     status = Column(String, default="processing") # e.g., 'processing', 'completed', 'failed'
+    content_hash = Column(String, unique=True, index=True, nullable=True) # SHA-256 of the uploaded file
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship: A Document can have many chunks
@@ -91,11 +111,34 @@ def create_db_and_tables():
     try:
         print("[MetadataStore] Initializing database and tables...")
         Base.metadata.create_all(bind=engine)
+        _add_missing_columns()
         print("[MetadataStore] Database tables created successfully.")
     except Exception as e:
         print(f"[MetadataStore] FATAL: Error creating database tables: {e}")
         raise
 
+def _add_missing_columns():
+    """
+    Adds columns introduced after a database was first created.
+    (create_all only creates missing tables, and we don't use Alembic yet.)
+    """
+    document_columns = {column["name"] for column in inspect(engine).get_columns("documents")}
+    if "content_hash" not in document_columns:
+        print("[MetadataStore] Adding 'content_hash' column to documents...")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE documents ADD COLUMN content_hash VARCHAR"))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)"
+            ))
+
+def dispose_engine_after_fork():
+    """
+    Gives a forked worker process its own connection pool.
+    Connections inherited from the parent are dropped without being closed
+    (closing them would break the parent's copies of the same sockets).
+    """
+    engine.dispose(close=False)
+
 @contextmanager
 def get_db() -> Session:
     """
@@ -114,23 +157,107 @@ def get_db() -> Session:
         
 # --- CRUD Functions ---
 
+def get_document_by_source_id(db: Session, source_id: str) -> Optional[Document]:
+    """Retrieves a document by its source ID."""
+    return db.query(Document).filter(Document.source_id == source_id).first()
+
+def create_document(
+    db: Session,
+    source_id: str,
+    file_name: str,
+    doc_type: IngestType,
+    storage_path: str,
+    content_hash: Optional[str] = None
+) -> Document:
+    """
+    Creates and commits a Document record (status 'processing').
+    
+    Raises sqlalchemy's IntegrityError if a document with the same
+    source_id, or a non-failed one with the same content_hash, exists.
+    """
+    if content_hash:
+        # A previous failed ingest of the same file must release the hash
+        db.query(Document).filter(
+            Document.content_hash == content_hash,
+            Document.status == "failed"
+        ).update({"content_hash": None})
+    
+    doc = Document(
+        source_id=source_id,
+        source_file_name=file_name,
+        doc_type=doc_type,
+        storage_path=storage_path,
+        status="processing",
+        content_hash=content_hash
+    )
+    db.add(doc)
+    db.commit()
+    db.refresh(doc)
+    return doc
+
+def get_document_by_content_hash(db: Session, content_hash: str) -> Optional[Document]:
+    """Retrieves a document that was not failed by the hash of its uploaded file."""
+    return (
+        db.query(Document)
+        .filter(Document.content_hash == content_hash, Document.status != "failed")
+        .first()
+    )
+
+def bulk_create_chunks(db: Session, document_id: int, chunks: List[TextChunkCreate]):
+    """
+    Inserts all chunks of a document with a single executemany INSERT
+    (Core, no per-object ORM bookkeeping).
+    
+    Does not commit: the caller commits together with the document's status.
+    """
+    if not chunks:
+        return
+    db.execute(
+        TextChunk.__table__.insert(),
+        [{"document_id": document_id, **chunk.model_dump()} for chunk in chunks]
+    )
+
+# The vector ID lookups sit on the query hot path: any relationship they
+# don't load explicitly is raiseload'ed, so touching it raises instead of
+# silently issuing one lazy query per chunk. Callers that need another
+# relationship must add a joinedload/selectinload for it here.
+
 def get_chunk_by_vector_id(db: Session, vector_id: int) -> Optional[TextChunk]:
     """Retrieves a single text chunk by its FAISS vector ID."""
     return (
         db.query(TextChunk)
         .filter(TextChunk.vector_id == vector_id)
-        .options(joinedload(TextChunk.document)) # Eagerly load the document
+        .options(joinedload(TextChunk.document), raiseload('*')) # Eagerly load the document, nothing else
         .first()
     )
 
+# Max IDs per `IN (...)` list: keeps each statement well under SQLite's
+# bound-parameter limit for large candidate sets
+VECTOR_ID_BATCH_SIZE = 500
+
 def get_chunks_by_vector_ids(db: Session, vector_ids: List[int]) -> List[TextChunk]:
-    """Retrieves multiple text chunks by their FAISS vector IDs, loading the parent document eagerly."""
+    """
+    Retrieves multiple text chunks by their FAISS vector IDs (one query per
+    VECTOR_ID_BATCH_SIZE IDs), loading the parent documents eagerly with one
+    extra query (no per-chunk lazy loads).
+    
+    Chunks are returned in the same order as `vector_ids`; IDs with no
+    matching row are skipped.
+    """
     if not vector_ids:
         return []
     
-    return (
-        db.query(TextChunk)
-        .filter(TextChunk.vector_id.in_(vector_ids))
-        .options(joinedload(TextChunk.document)) # <--- THIS IS THE CRITICAL FIX
-        .all()
-    )
\ No newline at end of file
+    chunks: List[TextChunk] = []
+    for start in range(0, len(vector_ids), VECTOR_ID_BATCH_SIZE):
+        chunks.extend(
+            db.query(TextChunk)
+            .filter(TextChunk.vector_id.in_(vector_ids[start:start + VECTOR_ID_BATCH_SIZE]))
+            # selectinload: one follow-up `SELECT documents WHERE id IN (...)`
+            # instead of repeating the document columns on every chunk row
+            .options(selectinload(TextChunk.document), raiseload('*'))
+            .all()
+        )
+    
+    position = {vector_id: i for i, vector_id in enumerate(vector_ids)}
+    chunks.sort(key=lambda chunk: position[chunk.vector_id])
+    return chunks
\ No newline at end of file
@@ -1,3 +1,4 @@
+import os
 import faiss
 import numpy as np
 from pathlib import Path
@@ -6,17 +7,31 @@ from typing import Optional, Tuple, List
 from app.config import Settings, get_settings
 from app.services.embedder import EmbeddingService, get_embedding_service
 
+try:
+    import fcntl # POSIX only
+except ImportError:
+    fcntl = None
+
 class VectorStore:
     """
     A service to manage the FAISS vector index.
     
     This is a singleton that loads the index on startup and provides
     methods to add vectors and search.
+    
+    A `read_only` store (the query API) memory-maps the index file where the
+    index type supports it, so processes share its pages through the OS page
+    cache instead of each holding a private copy; it cannot add or save.
     """
     
-    def __init__(self, settings: Settings, embed_service: EmbeddingService):
+    def __init__(self, settings: Settings, embed_service: EmbeddingService, read_only: bool = False):
         self.index_path = settings.VECTOR_DIR / "main_index.faiss"
+        self.read_only = read_only
         self.embedding_dim = embed_service.embedding_dim
+        self.hnsw_m = settings.FAISS_HNSW_M
+        self.hnsw_ef_search = settings.FAISS_HNSW_EF_SEARCH
+        self.ivf_nprobe = settings.FAISS_IVF_NPROBE
+        self.use_sq8 = settings.FAISS_SQ8
         self.index = self._load_or_create_index()
         
     def _load_or_create_index(self) -> faiss.Index:
@@ -25,9 +40,11 @@ class VectorStore:
         if self.index_path.exists():
             try:
                 print(f"[VectorStore] Loading existing FAISS index from {self.index_path}")
-                index = faiss.read_index(str(self.index_path))
+                io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if self.read_only else 0
+                index = faiss.read_index(str(self.index_path), io_flags)
                 if index.d != self.embedding_dim:
                     raise Exception(f"Index dim ({index.d}) != model dim ({self.embedding_dim})")
+                self._apply_search_params(index)
                 return index
             except Exception as e:
                 print(f"[VectorStore] FAILED to load index: {e}. Rebuilding...")
@@ -37,29 +54,82 @@ class VectorStore:
         print(f"[VectorStore] Creating new FAISS index with dim {self.embedding_dim}")
         self.index_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Using IndexFlatIP because our embedder normalizes embeddings.
-        # Inner Product (IP) on normalized vectors is equivalent to Cosine Similarity.
-        index = faiss.IndexFlatIP(self.embedding_dim)
+        # Our embedder normalizes embeddings, so Inner Product (IP) is equivalent
+        # to Cosine Similarity: scores are in [-1, 1] and higher = more similar.
+        # HNSW gives sub-linear (log N) search instead of a flat O(N) scan.
+        if self.use_sq8:
+            # 8-bit scalar quantization: 1 byte per dimension instead of 4.
+            # Embeddings are unit-normalized, so every component lies in
+            # [-1, 1]: the quantizer gets that fixed range (by "training" it on
+            # the two corner points) instead of one learned from whatever
+            # small first batch happens to be added.
+            index = faiss.IndexHNSWSQ(
+                self.embedding_dim, faiss.ScalarQuantizer.QT_8bit, self.hnsw_m, faiss.METRIC_INNER_PRODUCT
+            )
+            sq = faiss.downcast_index(index.storage).sq
+            sq.rangestat = faiss.ScalarQuantizer.RS_minmax
+            sq.rangestat_arg = 0.0
+            unit_range = np.vstack([
+                np.full(self.embedding_dim, -1.0, dtype=np.float32),
+                np.full(self.embedding_dim, 1.0, dtype=np.float32)
+            ])
+            index.train(unit_range)
+        else:
+            index = faiss.IndexHNSWFlat(self.embedding_dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = self.hnsw_ef_search
         return index
 
+    def _apply_search_params(self, index: faiss.Index):
+        """
+        Applies the query-time recall/latency knobs of a loaded index:
+        efSearch for HNSW, nprobe for IVF (e.g. an index rebuilt offline with
+        an "IVF<nlist>,Flat" factory once the corpus is large enough to train it).
+        """
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = self.hnsw_ef_search
+            return
+        try:
+            faiss.extract_index_ivf(index).nprobe = self.ivf_nprobe
+        except RuntimeError:
+            pass # Neither HNSW nor IVF: nothing to tune
+
     def add_vectors(self, vectors: np.ndarray) -> List[int]:
         """
         Adds a batch of vectors to the index.
         
         Args:
             vectors: A 2D numpy array of shape (num_vectors, embedding_dim).
+                     A float32 C-contiguous array is used (and L2-normalized)
+                     in place, without a copy.
             
         Returns:
             A list of the FAISS IDs (indices) for the newly added vectors.
         """
-        if not vectors.any():
+        if self.read_only:
+            raise RuntimeError("Cannot add vectors to a read-only VectorStore.")
+        
+        # (A size check, not vectors.any(): that scans every element and
+        # would also drop an all-zero batch)
+        if vectors.size == 0:
             return []
             
         if vectors.ndim != 2 or vectors.shape[1] != self.embedding_dim:
             raise ValueError(f"Invalid vector shape. Expected (n, {self.embedding_dim})")
         
-        # FAISS requires float32
-        vectors = vectors.astype('float32')
+        # FAISS requires contiguous float32; this is a no-op (no copy) when
+        # the embedder already returned exactly that
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        
+        # The embedder already normalizes, but an FP16 model does it at half
+        # precision; re-normalizing in place (one SIMD pass, no allocation)
+        # keeps stored norms exactly 1 so inner product stays true cosine.
+        # Queries don't need it: scaling a query scales all its scores equally.
+        faiss.normalize_L2(vectors)
+        
+        if not self.index.is_trained:
+            # SQ8 indexes are trained on creation; others (IVF) need a real
+            # training set
+            raise RuntimeError("FAISS index is not trained; train it offline before adding vectors.")
         
         start_index = self.index.ntotal
         self.index.add(vectors)
@@ -81,11 +151,9 @@ class VectorStore:
         Returns:
             A tuple of (distances, indices).
         """
-        if query_vector.ndim == 1:
-            # FAISS search expects a 2D array of (1, dim)
-            query_vector = np.expand_dims(query_vector, axis=0)
-            
-        query_vector = query_vector.astype('float32')
+        # FAISS search expects a contiguous float32 2D array of (1, dim);
+        # reshape returns a view and ascontiguousarray only copies if needed
+        query_vector = np.ascontiguousarray(query_vector.reshape(1, -1), dtype=np.float32)
         
         # D = distances (scores), I = indices (the vector IDs)
         distances, indices = self.index.search(query_vector, top_k)
@@ -93,25 +161,64 @@ class VectorStore:
         # Return the results for the first (and only) query
         return distances[0], indices[0]
 
+    def get_vectors(self, vector_ids: List[int]) -> np.ndarray:
+        """
+        Reconstructs the stored vectors for the given FAISS IDs.
+        
+        Returns:
+            A 2D numpy array of shape (len(vector_ids), embedding_dim).
+        """
+        return self.index.reconstruct_batch(np.asarray(vector_ids, dtype=np.int64))
+
     def save_index(self):
         """Saves the current index state to disk."""
+        if self.read_only:
+            raise RuntimeError("Cannot save a read-only VectorStore.")
+        
         print(f"[VectorStore] Saving FAISS index to {self.index_path}...")
-        faiss.write_index(self.index, str(self.index_path))
+        self._write_index_file()
         print("[VectorStore] Index saved.")
 
+    def _write_index_file(self):
+        """
+        Writes the index to a temp file and atomically renames it into place,
+        so readers never see a half-written index. On POSIX the write is also
+        serialized across worker processes with an exclusive flock.
+        """
+        tmp_path = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+        lock_path = self.index_path.with_name(f"{self.index_path.name}.lock")
+        
+        with open(lock_path, "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    faiss.write_index(self.index, str(tmp_path))
+                    os.replace(tmp_path, self.index_path)
+                except Exception:
+                    # Don't leave a partial temp file next to the index
+                    tmp_path.unlink(missing_ok=True)
+                    raise
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 # --- Singleton setup for Dependency Injection ---
 
 _vector_store: Optional[VectorStore] = None
 
-def get_vector_store() -> VectorStore:
+def get_vector_store(read_only: bool = False) -> VectorStore:
     """
     Dependency injector to get a singleton VectorStore.
     This ensures the index is only loaded once.
+    
+    `read_only` only applies to the call that creates the store: query-only
+    processes (the API) pass True, ingestion workers use the default.
     """
     global _vector_store
     if _vector_store is None:
         # This service depends on the embedder service being ready
         embed_service = get_embedding_service()
         settings = get_settings()
-        _vector_store = VectorStore(settings, embed_service)
-    return _vector_store
\ No newline at end of file
+        _vector_store = VectorStore(settings, embed_service, read_only=read_only)
+    return _vector_store
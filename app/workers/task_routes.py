@@ -1,3 +1,4 @@
+from kombu import Exchange, Queue
 from app.config import settings
 
 # Define our queues
@@ -11,7 +12,21 @@ CPU_QUEUE = settings.CELERY_DEFAULT_QUEUE  # e.g., "cpu_tasks"
 task_routes = {
     'app.workers.tasks.ingest_video': {'queue': GPU_QUEUE},
     'app.workers.tasks.ingest_image': {'queue': GPU_QUEUE},
+    # Video chord: frame analysis and embedding/indexing on the GPU worker,
+    # audio transcription (network + ffmpeg) on the CPU worker
+    'app.workers.tasks.describe_video_frames': {'queue': GPU_QUEUE},
+    'app.workers.tasks.index_video': {'queue': GPU_QUEUE},
     
     # All other tasks (like audio, text, or orchestration) go to the default CPU queue
     'app.workers.tasks.*': {'queue': CPU_QUEUE},
-}
\ No newline at end of file
+}
+
+# Queue declarations.
+# Both queues are transient (non-durable, non-persistent messages): a lost
+# ingest task is acceptable because the user can simply re-upload, and it
+# saves the broker a persistent write per enqueue.
+task_queues = (
+    Queue(CPU_QUEUE, Exchange(CPU_QUEUE, delivery_mode=1), routing_key=CPU_QUEUE, durable=False),
+    Queue(GPU_QUEUE, Exchange(GPU_QUEUE, delivery_mode=1), routing_key=GPU_QUEUE, durable=False),
+)
+task_default_queue = CPU_QUEUE
@@ -1,10 +1,44 @@
 from pathlib import Path
+from typing import Optional
+from celery import chord
+from celery.signals import worker_process_init
 from app.workers.celery_app import celery_app
 from app.api.schemas import TaskStatus, IngestType
 from app.services.ingestion_orchestrator import (
     process_audio_source, 
-    process_image_source
+    process_image_source,
+    create_video_document,
+    get_completed_ingest_artifacts,
+    transcribe_audio,
+    describe_video_frames,
+    index_video_document,
+    mark_document_failed
 )
+from app.services.embedder import get_embedding_service
+from app.services.sarvam_client import get_sarvam_client
+from app.store.vector_store import get_vector_store
+from app.store.metadata_store import dispose_engine_after_fork
+
+# --- Worker Warm-up ---
+
+@worker_process_init.connect
+def warm_up_worker_services(**kwargs):
+    """
+    Loads the heavy singleton services once per worker process, right after
+    it starts, so the first ingestion task doesn't pay the model-load cost.
+    (Fires for the prefork pool; other pools still load lazily on first use.)
+    
+    The FAISS index is loaded here, in the child, rather than at import time
+    in the pre-fork parent: each worker owns exactly one copy, and the parent
+    never holds one to be duplicated by copy-on-write.
+    """
+    # Never share the parent's pooled DB connections across processes
+    dispose_engine_after_fork()
+    
+    print("[Worker] Warming up ingestion services...")
+    get_embedding_service()
+    get_sarvam_client()
+    get_vector_store()
 
 # A helper to update task state (used by the orchestrator via task_self)
 def update_task_state(task, status: TaskStatus, details: str, progress: float = 0.0):
@@ -17,13 +51,32 @@ def update_task_state(task, status: TaskStatus, details: str, progress: float =
     # Using task.update_state is essential for reporting status back to Redis/FastAPI
     task.update_state(state=status.value, meta=meta)
 
+def build_success_meta(details: str, artifacts: dict) -> dict:
+    """
+    Final result of an ingestion task. Only a few scalars: it is kept in the
+    result backend and re-read on every status poll, while the full record
+    (chunks, timestamps, file paths) lives in the metadata DB.
+    """
+    return {
+        'status': TaskStatus.SUCCESS.value,
+        'details': details,
+        'progress_percent': 100.0,
+        'document_id': artifacts.get('document_id'),
+        'chunks_count': artifacts.get('metadata_count', 0),
+    }
+
 # --- The Main Ingestion Tasks ---
 
 @celery_app.task(bind=True, name="app.workers.tasks.ingest_video")
-def ingest_video(self, file_path: str, source_id: str, metadata: dict):
+def ingest_video(self, file_path: str, source_id: str, metadata: dict, content_hash: Optional[str] = None):
     """
     Celery task to process a video file.
-    Routes to the orchestrator for audio extraction, transcription, and indexing.
+    
+    Records the document, then replaces itself with a chord: audio
+    transcription (CPU queue) and frame extraction + Gemini Vision (GPU queue)
+    run in parallel, and index_video merges both into FAISS and the DB.
+    index_video inherits this task's ID, so status polling is unchanged;
+    the header tasks forward their progress to that ID.
     """
     task_id = self.request.id
     print(f"[TASK {task_id}] Received video: {file_path}")
@@ -34,24 +87,77 @@ def ingest_video(self, file_path: str, source_id: str, metadata: dict):
         language_code = metadata.get("language", "ta-IN")
         original_file_path = Path(file_path)
         file_name = original_file_path.name
+        
+        # Never ingest the same source twice (e.g. a redelivered task)
+        cached_artifacts = get_completed_ingest_artifacts(source_id)
+        if cached_artifacts is not None:
+            meta = build_success_meta("Video was already processed and indexed.", cached_artifacts)
+            self.update_state(state=TaskStatus.SUCCESS.value, meta=meta)
+            return meta
 
-        # Call the main orchestrator (PASSING self as the task_self argument)
-        artifacts = process_audio_source(
-            task_self=self, # <--- CRITICAL FIX: Passing the task instance
+        create_video_document(
             source_id=source_id,
             original_file_path=original_file_path,
             file_name=file_name,
-            doc_type=IngestType.VIDEO,
-            language=language_code
+            content_hash=content_hash
         )
-        
-        # --- Final Success ---
+
+    except Exception as e:
+        print(f"[TASK {task_id}] FAILED: {e}")
         meta = {
-            'status': TaskStatus.SUCCESS.value,
-            'details': "Video processed and indexed successfully (Multimodal).",
-            'progress_percent': 100.0,
-            'artifacts': artifacts
+            'status': TaskStatus.FAILURE.value,
+            'details': f"Failed to process video: {str(e)}",
+            'progress_percent': 0.0,
+            'errors': str(e)
         }
+        self.update_state(state=TaskStatus.FAILURE.value, meta=meta)
+        raise
+    
+    update_task_state(self, TaskStatus.PROCESSING, "Transcribing audio and analyzing frames in parallel...", 10.0)
+    workflow = chord(
+        [
+            transcribe_video_audio.s(file_path, source_id, language_code, progress_task_id=task_id),
+            describe_video_frames_task.s(file_path, source_id, progress_task_id=task_id)
+        ],
+        index_video.s(source_id=source_id).on_error(fail_video_ingest.s(source_id=source_id))
+    )
+    # Raises Ignore: this task's result is provided by the chord's body
+    raise self.replace(workflow)
+
+@celery_app.task(bind=True, name="app.workers.tasks.transcribe_video_audio")
+def transcribe_video_audio(self, file_path: str, source_id: str, language_code: str, progress_task_id: Optional[str] = None) -> str:
+    """Chord header: transcribes a video's audio track. Returns the transcript path."""
+    # Progress goes to the ingest_video task ID the client is polling
+    self.request.progress_task_id = progress_task_id
+    _, transcript_path = transcribe_audio(self, source_id, Path(file_path), language_code)
+    return str(transcript_path)
+
+@celery_app.task(bind=True, name="app.workers.tasks.describe_video_frames")
+def describe_video_frames_task(self, file_path: str, source_id: str, progress_task_id: Optional[str] = None) -> dict:
+    """Chord header: extracts a video's key frames and describes them with Gemini Vision."""
+    # Progress goes to the ingest_video task ID the client is polling
+    self.request.progress_task_id = progress_task_id
+    return describe_video_frames(self, source_id, Path(file_path))
+
+@celery_app.task(bind=True, name="app.workers.tasks.index_video")
+def index_video(self, header_results: list, source_id: str):
+    """
+    Chord body: embeds and indexes the transcript and frame descriptions
+    produced by the header tasks (results arrive in header order).
+    """
+    task_id = self.request.id
+    transcript_path, frame_descriptions = header_results
+    
+    try:
+        artifacts = index_video_document(
+            task_self=self,
+            source_id=source_id,
+            transcript_path=transcript_path,
+            frame_descriptions=frame_descriptions
+        )
+        
+        # --- Final Success ---
+        meta = build_success_meta("Video processed and indexed successfully (Multimodal).", artifacts)
         self.update_state(state=TaskStatus.SUCCESS.value, meta=meta)
         return meta
 
@@ -66,8 +172,14 @@ def ingest_video(self, file_path: str, source_id: str, metadata: dict):
         self.update_state(state=TaskStatus.FAILURE.value, meta=meta)
         raise
 
+@celery_app.task(name="app.workers.tasks.fail_video_ingest")
+def fail_video_ingest(request, exc, traceback, source_id: str):
+    """Errback of the video chord: marks the document failed if any stage failed."""
+    print(f"[TASK {request.id}] Video pipeline for {source_id} failed: {exc}")
+    mark_document_failed(source_id)
+
 @celery_app.task(bind=True, name="app.workers.tasks.ingest_audio")
-def ingest_audio(self, file_path: str, source_id: str, metadata: dict):
+def ingest_audio(self, file_path: str, source_id: str, metadata: dict, content_hash: Optional[str] = None):
     """
     Celery task to process an audio file.
     Routes to the orchestrator for transcription and indexing.
@@ -89,16 +201,12 @@ def ingest_audio(self, file_path: str, source_id: str, metadata: dict):
             original_file_path=original_file_path,
             file_name=file_name,
             doc_type=IngestType.AUDIO,
-            language=language_code
+            language=language_code,
+            content_hash=content_hash
         )
         
         # --- Final Success ---
-        meta = {
-            'status': TaskStatus.SUCCESS.value,
-            'details': "Audio processed and indexed successfully.",
-            'progress_percent': 100.0,
-            'artifacts': artifacts
-        }
+        meta = build_success_meta("Audio processed and indexed successfully.", artifacts)
         self.update_state(state=TaskStatus.SUCCESS.value, meta=meta)
         return meta
 
@@ -113,7 +221,7 @@ def ingest_audio(self, file_path: str, source_id: str, metadata: dict):
         raise
 
 @celery_app.task(bind=True, max_retries=5)
-def ingest_image(self, file_path: str, source_id: str, metadata: dict):
+def ingest_image(self, file_path: str, source_id: str, metadata: dict, content_hash: Optional[str] = None):
     """
     Celery task to process an image file.
     Routes to the (placeholder) orchestrator for image analysis.
@@ -137,12 +245,7 @@ def ingest_image(self, file_path: str, source_id: str, metadata: dict):
         )
         
         # --- Final Success ---
-        meta = {
-            'status': TaskStatus.SUCCESS.value,
-            'details': "Image processed successfully (placeholder).",
-            'progress_percent': 100.0,
-            'artifacts': artifacts
-        }
+        meta = build_success_meta("Image processed successfully (placeholder).", artifacts)
         self.update_state(state=TaskStatus.SUCCESS.value, meta=meta)
         return meta
 
@@ -154,4 +257,4 @@ def ingest_image(self, file_path: str, source_id: str, metadata: dict):
             'errors': str(e)
         }
         self.update_state(state=TaskStatus.FAILURE.value, meta=meta)
-        raise
\ No newline at end of file
+        raise